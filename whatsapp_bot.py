@@ -9,32 +9,51 @@ utilizando un modelo de lenguaje para extraer información estructurada y almace
 FLUJO PRINCIPAL:
 1. Conexión a WhatsApp Web mediante Selenium.
 2. Extracción de mensajes desde un canal origen.
-3. Procesamiento de cada mensaje con un modelo LLM local (Ollama/Llama).
+3. Procesamiento de los mensajes con un modelo LLM (Google Gemini).
 4. Almacenamiento de la información estructurada en SQLite.
 5. Redistribución del contenido a un canal destino.
 
 DEPENDENCIAS:
 - selenium: automatización del navegador.
-- requests: comunicación con la API de Llama.
+- google-generativeai: comunicación con la API de Gemini.
 - sqlite3: base de datos local.
-- schedule: programación de tareas.
+- apscheduler: programación de tareas.
 - hashlib: detección de duplicados.
+
+LICENCIA:
+Este código es de uso educativo y personal.
+Respeta los términos de servicio de WhatsApp.
 """
 
 import sqlite3
 import requests
 import json
+import re
 import time
 import argparse
-import schedule
+import asyncio
+import atexit
+import importlib.util
+import threading
+import concurrent.futures
 import google.generativeai as genai
-from datetime import datetime
+from collections import OrderedDict, deque
+from functools import lru_cache
+from datetime import datetime, timedelta
 from hashlib import sha256
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.common.exceptions import NoSuchElementException
+from selenium.common.exceptions import (
+    NoSuchElementException, SessionNotCreatedException, TimeoutException, WebDriverException
+)
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
+from apscheduler.schedulers.blocking import BlockingScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR
 from selenium.webdriver.chrome.service import Service
 
 import os
@@ -47,31 +66,116 @@ load_dotenv()
 # ============================================================================
 
 CANAL_ORIGEN = os.getenv("CANAL_ORIGEN", "CanalPorDefecto")
+CANALES_ORIGEN = [canal.strip() for canal in CANAL_ORIGEN.split(",") if canal.strip()]
 CANAL_DESTINO = os.getenv("CANAL_DESTINO", "DestinoPorDefecto")
 RUTA_SESION_CHROME = os.getenv("RUTA_SESION_CHROME", "./whatsapp_data")
 RUTA_DB = os.getenv("RUTA_DB", "./data/mensajes.db")
+# El SDK crea un único cliente gRPC (HTTP/2) por tipo y lo reutiliza en todas
+# las llamadas. No se fija transport: "grpc" rompería el cliente asíncrono,
+# que necesita el transporte por defecto "grpc_asyncio".
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-GEMINI_MODEL = genai.GenerativeModel("gemini-1.5-flash-8b")
+# Modelo más ligero, suficiente para la extracción de campos. La caché de
+# contexto exige una versión fija (p. ej. "gemini-1.5-flash-8b-001"), que solo
+# hace falta indicar aquí si las instrucciones llegan a su tamaño mínimo.
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-1.5-flash-8b")
+GEMINI_MODEL = genai.GenerativeModel(GEMINI_MODEL_NAME)
 HORARIOS_SCRAPING = os.getenv("HORARIOS_SCRAPING", "08:00,13:00,17:00").split(",")
 HORARIOS_ENVIO = os.getenv("HORARIOS_ENVIO", "08:10,13:10,17:10").split(",")
 HORARIO_RESUMEN = os.getenv("HORARIO_RESUMEN", "20:00")
+GEMINI_LIMITE_RPM = int(os.getenv("GEMINI_LIMITE_RPM", "30"))
+GEMINI_MAX_CONCURRENCIA = int(os.getenv("GEMINI_MAX_CONCURRENCIA", "10"))  # Peticiones simultáneas
+if GEMINI_LIMITE_RPM < 1:
+    raise ValueError(f"GEMINI_LIMITE_RPM debe ser al menos 1 (valor actual: {GEMINI_LIMITE_RPM})")
+if GEMINI_MAX_CONCURRENCIA < 1:
+    raise ValueError(f"GEMINI_MAX_CONCURRENCIA debe ser al menos 1 (valor actual: {GEMINI_MAX_CONCURRENCIA})")
+GEMINI_MIN_TOKENS_CACHE = 32768  # Tamaño mínimo admitido por la caché de contexto
+GEMINI_TTL_CACHE = 3600  # Segundos de vida de la caché de contexto
+LOTE_MENSAJES_LLM = int(os.getenv("LOTE_MENSAJES_LLM", "8"))  # Mensajes por petición; a partir de ~8-16 la mejora es marginal
+if LOTE_MENSAJES_LLM < 1:
+    raise ValueError(f"LOTE_MENSAJES_LLM debe ser al menos 1 (valor actual: {LOTE_MENSAJES_LLM})")
+GEMINI_MAX_TOKENS_MENSAJE = 512  # Tope de tokens de respuesta por mensaje extraído
+GEMINI_MAX_TOKENS_SALIDA = 8192  # Límite de tokens de salida del modelo
 DEBUG = os.getenv("DEBUG", "false").lower() == "true"
+MODO_HEADLESS = os.getenv("MODO_HEADLESS", "true").lower() == "true"
+RUTA_CAPTURA_QR = os.getenv("RUTA_CAPTURA_QR", "./qr_whatsapp.png")
+RUTA_CACHE_CHROMEDRIVER = os.path.join(os.path.expanduser("~"), ".cache", "whatsapp_bot", "chromedriver_path")
+DIAS_VALIDEZ_CHROMEDRIVER = 7
 
 # ============================================================================
 # MÓDULO DE BASE DE DATOS
 # ============================================================================
 
+# La carpeta de la base de datos se crea una sola vez al cargar el módulo.
+os.makedirs(os.path.dirname(RUTA_DB) or ".", exist_ok=True)
+
+
 def conectar_bd():
     """
     Establece la conexión con la base de datos SQLite.
-    Si la carpeta del archivo no existe, la crea.
+    
+    La conexión trabaja en modo autocommit (las transacciones se abren con BEGIN
+    explícito) y se ajusta con PRAGMAs de rendimiento: synchronous=NORMAL evita
+    un fsync por commit en modo WAL, y las tablas temporales y la caché de
+    páginas se mantienen en memoria.
+    
+    Las filas se devuelven como sqlite3.Row, accesibles por nombre de columna.
+    Como la conexión es compartida, su caché de sentencias preparadas se
+    reutiliza entre llamadas y la sentencia INSERT solo se compila una vez.
     
     Returns:
         sqlite3.Connection: Conexión a la base de datos.
     """
-    import os
-    os.makedirs(os.path.dirname(RUTA_DB), exist_ok=True)
-    return sqlite3.connect(RUTA_DB)
+    conn = sqlite3.connect(
+        RUTA_DB,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=200
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-20000")
+    conn.execute("PRAGMA mmap_size=268435456")
+    return conn
+
+
+_CONEXION_BD = None
+_LOCK_BD = threading.Lock()
+# La conexión es compartida entre hilos: las transacciones de escritura se
+# serializan para que un BEGIN no se abra dentro de otra transacción en curso.
+_LOCK_ESCRITURA_BD = threading.Lock()
+
+
+def obtener_conexion_bd():
+    """
+    Devuelve la conexión compartida con la base de datos.
+    La crea la primera vez que se necesita y la reutiliza en las llamadas
+    siguientes, evitando abrir y configurar una conexión por cada consulta.
+    
+    Returns:
+        sqlite3.Connection: Conexión compartida a la base de datos.
+    """
+    global _CONEXION_BD
+    if _CONEXION_BD is None:
+        with _LOCK_BD:
+            if _CONEXION_BD is None:
+                _CONEXION_BD = conectar_bd()
+    return _CONEXION_BD
+
+
+def cerrar_conexion_bd():
+    """
+    Cierra la conexión compartida con la base de datos, si está abierta.
+    Se registra con atexit para ejecutarse al terminar el programa.
+    """
+    global _CONEXION_BD
+    with _LOCK_BD:
+        if _CONEXION_BD is not None:
+            _CONEXION_BD.close()
+            _CONEXION_BD = None
+
+
+atexit.register(cerrar_conexion_bd)
 
 
 def crear_tabla_mensajes():
@@ -94,10 +198,19 @@ def crear_tabla_mensajes():
         - contacto: información de contacto extraída
         - canal: nombre del canal de WhatsApp de origen
         - hash: hash SHA256 del texto (para evitar duplicados)
+        - sent_at: momento en que se envió al canal destino (NULL si no se ha enviado)
+
+    También activa el modo WAL (journal_mode=WAL) en la base de datos y añade
+    la columna 'sent_at' a las bases de datos creadas antes de que existiera.
     """
-    conn = conectar_bd()
+    conn = obtener_conexion_bd()
     cursor = conn.cursor()
 
+    # El modo WAL es persistente en el archivo: basta con activarlo una vez
+    # para que todas las conexiones posteriores lo hereden. Permite leer
+    # mientras el scraper escribe.
+    cursor.execute("PRAGMA journal_mode=WAL")
+
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS mensajes (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -113,20 +226,35 @@ def crear_tabla_mensajes():
             formulario TEXT,
             contacto TEXT,
             canal TEXT,
-            hash TEXT UNIQUE
+            hash TEXT UNIQUE,
+            sent_at DATETIME
         )
     ''')
 
+    columnas = {fila["name"] for fila in cursor.execute("PRAGMA table_info(mensajes)")}
+    if "sent_at" not in columnas:
+        cursor.execute("ALTER TABLE mensajes ADD COLUMN sent_at DATETIME")
+
+    # Índice sobre el día de 'fecha' para que las consultas del día actual
+    # (que filtran por DATE(fecha)) no recorran toda la tabla. Incluye 'fecha'
+    # para devolver las filas ya ordenadas.
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_mensajes_dia
+        ON mensajes(DATE(fecha), fecha)
+    ''')
+
     conn.commit()
-    conn.close()
     if DEBUG:
         print("Tabla de mensajes creada o verificada correctamente.")
 
 
+@lru_cache(maxsize=8192)
 def generar_hash_mensaje(texto):
     """
     Genera un hash SHA256 único para el texto del mensaje.
     Esto permite detectar y evitar la inserción de mensajes duplicados.
+    Los resultados se memorizan: en las pasadas repetidas de scraping los
+    mismos mensajes visibles no se vuelven a hashear.
     
     Args:
         texto (str): Contenido del mensaje.
@@ -134,25 +262,84 @@ def generar_hash_mensaje(texto):
     Returns:
         str: Hash SHA256 del texto.
     """
-    return sha256(texto.encode("utf-8")).hexdigest()
+    # usedforsecurity=False: el hash solo sirve para deduplicar, lo que permite
+    # a OpenSSL usar su implementación más rápida (p. ej. instrucciones SHA-NI).
+    return sha256(texto.encode("utf-8"), usedforsecurity=False).hexdigest()
+
+
+# Claves hash() de los textos ya guardados en la base de datos durante este
+# proceso. Permiten descartar en memoria los mensajes que siguen visibles en
+# las siguientes pasadas, sin calcular su SHA-256 ni consultar SQLite.
+# Se guardan como LRU acotado para que no crezcan sin límite en modo
+# automático; los mensajes olvidados los sigue descartando la base de datos.
+MAX_MENSAJES_VISTOS = 200_000
+_MENSAJES_VISTOS = OrderedDict()
 
 
-def mensaje_ya_existe(hash_mensaje):
+def mensaje_visto(texto):
     """
-    Verifica si un mensaje con el hash dado ya existe en la base de datos.
+    Indica si el texto ya se guardó (o ya estaba guardado) durante este proceso.
+    Usa hash() de Python, mucho más barato que SHA-256; el SHA-256 sigue siendo
+    la clave persistente en la base de datos.
     
     Args:
-        hash_mensaje (str): Hash SHA256 del mensaje.
+        texto (str): Contenido del mensaje.
     
     Returns:
-        bool: True si el mensaje ya está registrado, False en caso contrario.
+        bool: True si el mensaje ya se registró como visto.
     """
-    conn = conectar_bd()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM mensajes WHERE hash=?", (hash_mensaje,))
-    existe = cursor.fetchone() is not None
-    conn.close()
-    return existe
+    clave = hash(texto)
+    if clave in _MENSAJES_VISTOS:
+        _MENSAJES_VISTOS.move_to_end(clave)
+        return True
+    return False
+
+
+def registrar_mensajes_vistos(textos):
+    """
+    Registra como vistos los textos que ya están en la base de datos,
+    descartando los menos usados si se supera MAX_MENSAJES_VISTOS.
+    
+    Args:
+        textos (iterable of str): Contenido de los mensajes.
+    """
+    for texto in textos:
+        clave = hash(texto)
+        _MENSAJES_VISTOS[clave] = None
+        _MENSAJES_VISTOS.move_to_end(clave)
+
+    while len(_MENSAJES_VISTOS) > MAX_MENSAJES_VISTOS:
+        _MENSAJES_VISTOS.popitem(last=False)
+
+
+# Por debajo del límite de variables por consulta de las versiones antiguas de SQLite.
+MAX_VARIABLES_CONSULTA = 900
+
+
+def obtener_hashes_existentes(hashes):
+    """
+    Indica cuáles de los hashes dados ya están en la base de datos.
+    Se resuelve con una consulta WHERE hash IN (...) sobre el índice UNIQUE,
+    en lugar de hacer una consulta por mensaje. Si hay más hashes que
+    variables admitidas por consulta, se divide en varias.
+    
+    Args:
+        hashes (iterable of str): Hashes SHA256 a comprobar.
+    
+    Returns:
+        set of str: Hashes que ya están registrados.
+    """
+    hashes = list(hashes)
+    existentes = set()
+    cursor = obtener_conexion_bd().cursor()
+
+    for inicio in range(0, len(hashes), MAX_VARIABLES_CONSULTA):
+        bloque = hashes[inicio:inicio + MAX_VARIABLES_CONSULTA]
+        marcadores = ",".join("?" * len(bloque))
+        cursor.execute(f"SELECT hash FROM mensajes WHERE hash IN ({marcadores})", bloque)
+        existentes.update(fila[0] for fila in cursor.fetchall())
+
+    return existentes
 
 
 def limpiar_campo_extraido(valor):
@@ -180,121 +367,198 @@ def limpiar_campo_extraido(valor):
     return valor_limpio if valor_limpio else None
 
 
-def insertar_mensaje_bd(texto_mensaje, canal, campos_extraidos):
+SQL_INSERTAR_MENSAJE = '''
+    INSERT OR IGNORE INTO mensajes (
+        fecha, texto, pais, ciudad, fecha_inicio, fecha_fin, 
+        fecha_limite_inscripcion, tematica, infopack, formulario, 
+        contacto, canal, hash
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def preparar_fila_mensaje(texto_mensaje, canal, campos_extraidos, hash_mensaje=None):
     """
-    Inserta un nuevo mensaje procesado en la base de datos.
-    Comprueba duplicados usando el hash del contenido.
-    Limpia y normaliza todos los campos extraídos antes de almacenarlos.
+    Construye la fila de valores que se insertará en la tabla 'mensajes'.
+    Limpia y normaliza todos los campos extraídos y calcula el hash del contenido.
     
     Args:
         texto_mensaje (str): Contenido original del mensaje.
         canal (str): Nombre del canal de origen.
         campos_extraidos (dict): Campos estructurados extraídos por el LLM.
-    """
-    conn = conectar_bd()
-    cursor = conn.cursor()
+        hash_mensaje (str, optional): Hash ya calculado del mensaje.
     
-    hash_mensaje = generar_hash_mensaje(texto_mensaje)
-
+    Returns:
+        tuple: Valores en el mismo orden que las columnas de SQL_INSERTAR_MENSAJE.
+    """
     campos_limpios = {
-        "pais": limpiar_campo_extraido(campos_extraidos.get("pais")),
-        "ciudad": limpiar_campo_extraido(campos_extraidos.get("ciudad")),
-        "fecha_inicio": limpiar_campo_extraido(campos_extraidos.get("fecha_inicio")),
-        "fecha_fin": limpiar_campo_extraido(campos_extraidos.get("fecha_fin")),
-        "fecha_limite_inscripcion": limpiar_campo_extraido(campos_extraidos.get("fecha_limite_inscripcion")),
-        "tematica": limpiar_campo_extraido(campos_extraidos.get("tematica")),
-        "infopack": limpiar_campo_extraido(campos_extraidos.get("infopack")),
-        "formulario": limpiar_campo_extraido(campos_extraidos.get("formulario")),
-        "contacto": limpiar_campo_extraido(campos_extraidos.get("contacto")),
+        campo: limpiar_campo_extraido(campos_extraidos.get(campo))
+        for campo in CAMPOS_EXTRACCION
     }
 
     if DEBUG:
-        print("Insertando mensaje con campos extraídos:")
+        print("Preparando mensaje con campos extraídos:")
         for campo, valor in campos_limpios.items():
             print(f"   {campo}: {valor}")
 
-    try:
-        cursor.execute('''
-            INSERT INTO mensajes (
-                fecha, texto, pais, ciudad, fecha_inicio, fecha_fin, 
-                fecha_limite_inscripcion, tematica, infopack, formulario, 
-                contacto, canal, hash
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            datetime.now(),
-            texto_mensaje,
-            campos_limpios["pais"],
-            campos_limpios["ciudad"],
-            campos_limpios["fecha_inicio"],
-            campos_limpios["fecha_fin"],
-            campos_limpios["fecha_limite_inscripcion"],
-            campos_limpios["tematica"],
-            campos_limpios["infopack"],
-            campos_limpios["formulario"],
-            campos_limpios["contacto"],
-            canal,
-            hash_mensaje
-        ))
+    return (
+        datetime.now(),
+        texto_mensaje,
+        campos_limpios["pais"],
+        campos_limpios["ciudad"],
+        campos_limpios["fecha_inicio"],
+        campos_limpios["fecha_fin"],
+        campos_limpios["fecha_limite_inscripcion"],
+        campos_limpios["tematica"],
+        campos_limpios["infopack"],
+        campos_limpios["formulario"],
+        campos_limpios["contacto"],
+        canal,
+        hash_mensaje or generar_hash_mensaje(texto_mensaje)
+    )
 
-        conn.commit()
-        if DEBUG:
-            print("Mensaje guardado correctamente en la base de datos.")
 
-    except sqlite3.IntegrityError:
-        if DEBUG:
-            print("Mensaje duplicado detectado. No se insertó en la base de datos.")
+def insertar_mensajes_bd_bulk(filas):
+    """
+    Inserta un lote de mensajes en una única transacción.
+    Evita abrir una conexión y confirmar (fsync) por cada mensaje: todas las filas
+    se insertan con una sola sentencia preparada y un único COMMIT.
     
-    finally:
-        conn.close()
+    Args:
+        filas (list of tuple): Filas generadas con preparar_fila_mensaje().
+    
+    Returns:
+        int: Número de mensajes realmente insertados (los duplicados se ignoran).
+    """
+    if not filas:
+        return 0
+
+    conn = obtener_conexion_bd()
+
+    with _LOCK_ESCRITURA_BD:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            cursor.executemany(SQL_INSERTAR_MENSAJE, filas)
+            conn.commit()
+            insertados = cursor.rowcount
+
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"Error al guardar el lote de mensajes en la base de datos: {e}")
+            return 0
+
+    if DEBUG:
+        print(f"{insertados} de {len(filas)} mensajes guardados en la base de datos.")
+
+    return insertados
 
 
 def obtener_mensajes_del_dia():
     """
     Recupera todos los mensajes almacenados cuya fecha corresponda al día actual.
     Útil para enviar mensajes nuevos o generar el resumen diario.
+    Solo se seleccionan las columnas que usan el envío, el resumen y las estadísticas.
     
     Returns:
-        list of tuples: Mensajes recuperados de la base de datos.
+        list of sqlite3.Row: Mensajes recuperados, accesibles por nombre de columna.
     """
-    conn = conectar_bd()
+    conn = obtener_conexion_bd()
     cursor = conn.cursor()
     
     cursor.execute("""
-        SELECT * FROM mensajes 
+        SELECT id, fecha, texto, pais, ciudad, fecha_inicio, fecha_fin,
+               fecha_limite_inscripcion, tematica, infopack, formulario, contacto
+        FROM mensajes 
         WHERE DATE(fecha) = DATE('now')
         ORDER BY fecha ASC
     """)
     
     mensajes = cursor.fetchall()
-    conn.close()
     
     if DEBUG:
         print(f"Se encontraron {len(mensajes)} mensajes correspondientes al día de hoy.")
     
     return mensajes
 
-# ============================================================================
-# MÓDULO EXTRACTOR LLM (versión Google Gemini)
-# ============================================================================
 
-def crear_prompt_extraccion(mensaje):
+def contar_mensajes_del_dia():
     """
-    Genera el prompt que se enviará al modelo de lenguaje (LLM) para
-    extraer información estructurada de un mensaje de WhatsApp.
+    Cuenta los mensajes almacenados en el día actual sin traer sus filas.
+    El recuento se resuelve solo con el índice idx_mensajes_dia.
     
-    Args:
-        mensaje (str): Texto original del mensaje de WhatsApp.
+    Returns:
+        int: Número de mensajes del día.
+    """
+    cursor = obtener_conexion_bd().cursor()
+    cursor.execute("SELECT COUNT(*) FROM mensajes WHERE DATE(fecha) = DATE('now')")
+    return cursor.fetchone()[0]
+
+
+def obtener_mensajes_pendientes_envio():
+    """
+    Recupera los mensajes del día que todavía no se han enviado al canal destino.
     
     Returns:
-        str: Prompt formateado para el modelo LLM.
+        list of sqlite3.Row: Mensajes pendientes (columnas id y texto).
+    """
+    conn = obtener_conexion_bd()
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        SELECT id, texto FROM mensajes
+        WHERE DATE(fecha) = DATE('now') AND sent_at IS NULL
+        ORDER BY fecha ASC
+    """)
+
+    mensajes = cursor.fetchall()
+
+    if DEBUG:
+        print(f"Se encontraron {len(mensajes)} mensajes del día pendientes de envío.")
+
+    return mensajes
+
+
+def marcar_mensajes_enviados(ids_mensajes):
+    """
+    Registra como enviados los mensajes indicados, en una única transacción.
+    
+    Args:
+        ids_mensajes (list of int): Identificadores de los mensajes enviados.
     """
-    return f"""
+    if not ids_mensajes:
+        return
+
+    conn = obtener_conexion_bd()
+
+    with _LOCK_ESCRITURA_BD:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            cursor.executemany(
+                "UPDATE mensajes SET sent_at = CURRENT_TIMESTAMP WHERE id = ?",
+                [(id_mensaje,) for id_mensaje in ids_mensajes]
+            )
+            conn.commit()
+
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"Error al marcar los mensajes como enviados: {e}")
+
+# ============================================================================
+# MÓDULO EXTRACTOR LLM (versión Google Gemini)
+# ============================================================================
+
+# Plantilla fija del prompt de extracción. Se construye una sola vez al importar
+# el módulo; cada mensaje solo sustituye el marcador {{MENSAJE}}.
+# Las instrucciones son estáticas y pueden guardarse en la caché de contexto de
+# Gemini; la parte del mensaje es lo único que cambia entre peticiones.
+PROMPT_EXTRACCION_INSTRUCCIONES = """
 Eres un extractor de datos especializado en oportunidades de movilidad juvenil.
 Tu tarea es extraer información específica del siguiente mensaje de WhatsApp.
 
 IMPORTANTE: Devuelve SOLO un JSON válido con esta estructura exacta:
 
-{{
+{
   "pais": "...",
   "ciudad": "...",
   "fecha_inicio": "...",
@@ -304,7 +568,7 @@ IMPORTANTE: Devuelve SOLO un JSON válido con esta estructura exacta:
   "infopack": "...",
   "formulario": "...",
   "contacto": "..."
-}}
+}
 
 REGLAS DE EXTRACCIÓN:
 - Si un campo no aparece en el texto, usa null.
@@ -327,12 +591,233 @@ EJEMPLOS DE QUÉ BUSCAR:
 
 ---
 
-MENSAJE A PROCESAR:
-\"\"\"{mensaje}\"\"\"
+"""
+
+PROMPT_EXTRACCION_MENSAJE = """MENSAJE A PROCESAR:
+\"\"\"{{MENSAJE}}\"\"\"
 
 Responde solo con el JSON:
 """
 
+PROMPT_EXTRACCION_BASE = PROMPT_EXTRACCION_INSTRUCCIONES + PROMPT_EXTRACCION_MENSAJE
+
+# Las instrucciones van como instrucción de sistema del modelo: cada petición
+# solo lleva el mensaje y el prefijo idéntico puede reutilizarse entre llamadas.
+INSTRUCCIONES_SISTEMA_EXTRACCION = PROMPT_EXTRACCION_INSTRUCCIONES.rstrip().removesuffix("---").rstrip()
+GEMINI_MODEL_EXTRACCION = genai.GenerativeModel(
+    GEMINI_MODEL_NAME,
+    system_instruction=INSTRUCCIONES_SISTEMA_EXTRACCION
+)
+
+PROMPT_EXTRACCION_LOTE = """A continuación hay {{TOTAL}} mensajes independientes.
+Aplica las instrucciones a cada uno por separado.
+
+{{MENSAJES}}
+
+Responde solo con un array JSON de exactamente {{TOTAL}} objetos, uno por mensaje
+y en el mismo orden: [{...}, {...}]
+"""
+
+
+CAMPOS_EXTRACCION = (
+    "pais", "ciudad", "fecha_inicio", "fecha_fin", "fecha_limite_inscripcion",
+    "tematica", "infopack", "formulario", "contacto"
+)
+
+# Esquema de la respuesta: Gemini devuelve directamente JSON válido con estos
+# campos, sin texto alrededor.
+ESQUEMA_CAMPOS_EXTRACCION = {
+    "type": "object",
+    "properties": {campo: {"type": "string", "nullable": True} for campo in CAMPOS_EXTRACCION},
+}
+
+# Extracción determinista (temperature 0) y con la salida acotada: la
+# generación de tokens es la parte más lenta de cada petición.
+CONFIG_GENERACION_EXTRACCION = {
+    "response_mime_type": "application/json",
+    "response_schema": ESQUEMA_CAMPOS_EXTRACCION,
+    "temperature": 0,
+    "max_output_tokens": GEMINI_MAX_TOKENS_MENSAJE,
+}
+
+CONFIG_GENERACION_LOTE = {
+    "response_mime_type": "application/json",
+    "response_schema": {"type": "array", "items": ESQUEMA_CAMPOS_EXTRACCION},
+    "temperature": 0,
+    "max_output_tokens": min(GEMINI_MAX_TOKENS_MENSAJE * LOTE_MENSAJES_LLM, GEMINI_MAX_TOKENS_SALIDA),
+}
+
+
+def crear_prompt_extraccion(mensaje, incluir_instrucciones=True):
+    """
+    Genera el prompt que se enviará al modelo de lenguaje (LLM) para
+    extraer información estructurada de un mensaje de WhatsApp.
+    
+    Args:
+        mensaje (str): Texto original del mensaje de WhatsApp.
+        incluir_instrucciones (bool): False si las instrucciones ya van en el
+            modelo (instrucción de sistema o caché de contexto de Gemini).
+    
+    Returns:
+        str: Prompt formateado para el modelo LLM.
+    """
+    plantilla = PROMPT_EXTRACCION_BASE if incluir_instrucciones else PROMPT_EXTRACCION_MENSAJE
+    return plantilla.replace("{{MENSAJE}}", mensaje.strip())
+
+
+def crear_prompt_extraccion_batch(mensajes, incluir_instrucciones=True):
+    """
+    Genera un único prompt con varios mensajes numerados para que el modelo
+    devuelva un array JSON con los campos de cada uno. Las instrucciones se
+    envían una sola vez para todo el lote.
+    
+    Args:
+        mensajes (list of str): Textos originales de los mensajes.
+        incluir_instrucciones (bool): False si las instrucciones ya van en el
+            modelo (instrucción de sistema o caché de contexto de Gemini).
+    
+    Returns:
+        str: Prompt formateado para el modelo LLM.
+    """
+    bloques = "\n\n".join(
+        f'--- MENSAJE {i} ---\n"""{mensaje.strip()}"""'
+        for i, mensaje in enumerate(mensajes, start=1)
+    )
+    prompt = (PROMPT_EXTRACCION_LOTE
+              .replace("{{TOTAL}}", str(len(mensajes)))
+              .replace("{{MENSAJES}}", bloques))
+    return PROMPT_EXTRACCION_INSTRUCCIONES + prompt if incluir_instrucciones else prompt
+
+
+_CACHE_INSTRUCCIONES = None
+_CACHE_INSTRUCCIONES_EXPIRA = 0
+_CACHE_INSTRUCCIONES_ADMITIDA = None
+_LOCK_CACHE_INSTRUCCIONES = threading.Lock()
+
+
+def obtener_modelo_extraccion():
+    """
+    Devuelve el modelo con el que se harán las extracciones. En ambos casos
+    las instrucciones ya van en el modelo y el prompt solo lleva los mensajes.
+    Si las instrucciones alcanzan el tamaño mínimo de la caché de contexto de
+    Gemini, se suben una vez al servidor como instrucción de sistema y se
+    reutilizan en cada petición, de modo que solo se facturan los tokens del
+    mensaje. La caché se renueva al caducar. Si no es posible usarla, se
+    devuelve GEMINI_MODEL_EXTRACCION, con las instrucciones de sistema normales.
+    
+    Returns:
+        genai.GenerativeModel: Modelo de extracción.
+    """
+    global _CACHE_INSTRUCCIONES, _CACHE_INSTRUCCIONES_EXPIRA, _CACHE_INSTRUCCIONES_ADMITIDA
+
+    with _LOCK_CACHE_INSTRUCCIONES:
+        try:
+            # Con unos 4 caracteres por token, si la estimación local ya queda
+            # por debajo del mínimo no hace falta preguntar a la API.
+            if (_CACHE_INSTRUCCIONES_ADMITIDA is None
+                    and len(INSTRUCCIONES_SISTEMA_EXTRACCION) // 4 < GEMINI_MIN_TOKENS_CACHE):
+                _CACHE_INSTRUCCIONES_ADMITIDA = False
+                if DEBUG:
+                    print("Instrucciones del prompt por debajo del mínimo, no se usará la caché de contexto.")
+
+            if _CACHE_INSTRUCCIONES_ADMITIDA is None:
+                tokens = GEMINI_MODEL.count_tokens(INSTRUCCIONES_SISTEMA_EXTRACCION).total_tokens
+                _CACHE_INSTRUCCIONES_ADMITIDA = tokens >= GEMINI_MIN_TOKENS_CACHE
+                if DEBUG:
+                    estado = "se usará" if _CACHE_INSTRUCCIONES_ADMITIDA else "no se usará"
+                    print(f"Instrucciones del prompt: {tokens} tokens, {estado} la caché de contexto.")
+
+            if not _CACHE_INSTRUCCIONES_ADMITIDA:
+                return GEMINI_MODEL_EXTRACCION
+
+            # Se renueva un minuto antes de caducar para no usar una caché expirada.
+            if _CACHE_INSTRUCCIONES is None or time.monotonic() >= _CACHE_INSTRUCCIONES_EXPIRA - 60:
+                cache = genai.caching.CachedContent.create(
+                    model=GEMINI_MODEL_NAME,
+                    display_name="whatsapp_bot_extraccion",
+                    system_instruction=INSTRUCCIONES_SISTEMA_EXTRACCION,
+                    ttl=timedelta(seconds=GEMINI_TTL_CACHE)
+                )
+                _CACHE_INSTRUCCIONES = genai.GenerativeModel.from_cached_content(cached_content=cache)
+                _CACHE_INSTRUCCIONES_EXPIRA = time.monotonic() + GEMINI_TTL_CACHE
+                if DEBUG:
+                    print(f"Caché de contexto creada en Gemini: {cache.name}")
+
+            return _CACHE_INSTRUCCIONES
+
+        except Exception as e:
+            print(f"No se pudo usar la caché de contexto de Gemini: {e}")
+            _CACHE_INSTRUCCIONES_ADMITIDA = False
+            return GEMINI_MODEL_EXTRACCION
+
+
+def procesar_respuesta_llm(texto_respuesta):
+    """
+    Localiza y parsea el JSON contenido en la respuesta del modelo.
+    
+    Args:
+        texto_respuesta (str): Texto devuelto por el modelo.
+    
+    Returns:
+        dict: Campos extraídos del mensaje.
+    
+    Raises:
+        json.JSONDecodeError: Si la respuesta no contiene un JSON válido.
+    """
+    if DEBUG:
+        print("Respuesta cruda del modelo:")
+        print(texto_respuesta)
+
+    inicio_json = texto_respuesta.find('{')
+    fin_json = texto_respuesta.rfind('}') + 1
+
+    if inicio_json != -1 and fin_json > inicio_json:
+        json_str = texto_respuesta[inicio_json:fin_json]
+        datos_extraidos = json.loads(json_str)
+
+        if DEBUG:
+            print("Campos extraídos correctamente:")
+            for campo, valor in datos_extraidos.items():
+                print(f"   {campo}: {valor}")
+
+        return datos_extraidos
+
+    raise json.JSONDecodeError("No se encontró un JSON válido en la respuesta", texto_respuesta, 0)
+
+
+def procesar_respuesta_llm_lote(texto_respuesta, total):
+    """
+    Localiza y parsea el array JSON devuelto para un lote de mensajes.
+    
+    Args:
+        texto_respuesta (str): Texto devuelto por el modelo.
+        total (int): Número de mensajes enviados en el lote.
+    
+    Returns:
+        list of dict: Campos extraídos de cada mensaje, en orden.
+    
+    Raises:
+        json.JSONDecodeError: Si la respuesta no contiene un array JSON válido.
+        ValueError: Si el array no tiene un objeto por mensaje.
+    """
+    if DEBUG:
+        print("Respuesta cruda del modelo (lote):")
+        print(texto_respuesta)
+
+    inicio_json = texto_respuesta.find('[')
+    fin_json = texto_respuesta.rfind(']') + 1
+
+    if inicio_json == -1 or fin_json <= inicio_json:
+        raise json.JSONDecodeError("No se encontró un array JSON en la respuesta", texto_respuesta, 0)
+
+    datos_extraidos = json.loads(texto_respuesta[inicio_json:fin_json])
+
+    if (not isinstance(datos_extraidos, list) or len(datos_extraidos) != total
+            or not all(isinstance(datos, dict) for datos in datos_extraidos)):
+        raise ValueError(f"Se esperaban {total} objetos JSON en la respuesta del lote")
+
+    return datos_extraidos
+
 
 def extraer_campos_con_llm(mensaje):
     """
@@ -346,58 +831,293 @@ def extraer_campos_con_llm(mensaje):
     Returns:
         dict: Diccionario con los campos extraídos del mensaje.
     """
-    prompt = crear_prompt_extraccion(mensaje)
+    modelo = obtener_modelo_extraccion()
+    prompt = crear_prompt_extraccion(mensaje, incluir_instrucciones=False)
+    texto_respuesta = ""
     
     try:
         if DEBUG:
             print("Enviando solicitud a Gemini...")
 
         # Llamada al modelo
-        response = GEMINI_MODEL.generate_content(prompt)
+        response = modelo.generate_content(prompt, generation_config=CONFIG_GENERACION_EXTRACCION)
         texto_respuesta = response.text.strip()
+        return procesar_respuesta_llm(texto_respuesta)
 
+    except json.JSONDecodeError as e:
+        print(f"Error: la respuesta del modelo no es JSON válido: {e}")
         if DEBUG:
-            print("Respuesta cruda del modelo:")
-            print(texto_respuesta)
+            print(f"Respuesta recibida: {texto_respuesta}")
+        return {}
+
+    except Exception as e:
+        print(f"Error inesperado al procesar con el modelo Gemini: {e}")
+        return {}
+
 
-        # Intentar localizar y parsear el JSON en la respuesta.
-        inicio_json = texto_respuesta.find('{')
-        fin_json = texto_respuesta.rfind('}') + 1
+# Marcas de tiempo de las últimas peticiones a Gemini (ventana deslizante de 60 s).
+_PETICIONES_GEMINI = deque()
+_BUCLE_LLM = None
 
-        if inicio_json != -1 and fin_json > inicio_json:
-            json_str = texto_respuesta[inicio_json:fin_json]
-            datos_extraidos = json.loads(json_str)
 
+async def esperar_turno_gemini(cerrojo):
+    """
+    Respeta el límite de peticiones por minuto de Gemini mediante una ventana
+    deslizante: si en los últimos 60 segundos ya se alcanzó GEMINI_LIMITE_RPM,
+    espera hasta que la petición más antigua salga de la ventana.
+    
+    Args:
+        cerrojo (asyncio.Lock): Cerrojo que serializa el acceso a la ventana.
+    """
+    async with cerrojo:
+        while True:
+            ahora = time.monotonic()
+            while _PETICIONES_GEMINI and ahora - _PETICIONES_GEMINI[0] >= 60:
+                _PETICIONES_GEMINI.popleft()
+
+            if len(_PETICIONES_GEMINI) < GEMINI_LIMITE_RPM:
+                _PETICIONES_GEMINI.append(ahora)
+                return
+
+            espera = 60 - (ahora - _PETICIONES_GEMINI[0])
+            if DEBUG:
+                print(f"Límite de peticiones a Gemini alcanzado. Esperando {espera:.1f}s...")
+            await asyncio.sleep(espera)
+
+
+async def extraer_campos_con_llm_async(mensaje, modelo, semaforo, cerrojo):
+    """
+    Versión asíncrona de extraer_campos_con_llm().
+    El semáforo limita las peticiones simultáneas y el cerrojo protege
+    la ventana de control de peticiones por minuto.
+    
+    Args:
+        mensaje (str): Texto original del mensaje.
+        modelo (genai.GenerativeModel): Modelo de extracción a usar.
+        semaforo (asyncio.Semaphore): Límite de peticiones en vuelo.
+        cerrojo (asyncio.Lock): Cerrojo de la ventana de peticiones por minuto.
+    
+    Returns:
+        dict: Diccionario con los campos extraídos del mensaje.
+    
+    Raises:
+        Exception: Si falla la petición a Gemini (cuota, red...), para que el
+            mensaje no se guarde vacío y se reintente en la siguiente pasada.
+    """
+    prompt = crear_prompt_extraccion(mensaje, incluir_instrucciones=False)
+    texto_respuesta = ""
+
+    async with semaforo:
+        try:
+            await esperar_turno_gemini(cerrojo)
+            response = await modelo.generate_content_async(
+                prompt, generation_config=CONFIG_GENERACION_EXTRACCION
+            )
+            texto_respuesta = response.text.strip()
+            return procesar_respuesta_llm(texto_respuesta)
+
+        except json.JSONDecodeError as e:
+            print(f"Error: la respuesta del modelo no es JSON válido: {e}")
+            if DEBUG:
+                print(f"Respuesta recibida: {texto_respuesta}")
+            return {}
+
+        except Exception as e:
+            print(f"Error inesperado al procesar con el modelo Gemini: {e}")
+            raise
+
+
+async def extraer_campos_lote_async(mensajes, modelo, semaforo, cerrojo):
+    """
+    Extrae los campos de un lote de mensajes con una sola petición a Gemini.
+    Si la respuesta no es un array válido con un objeto por mensaje, se
+    repite la extracción de ese lote mensaje a mensaje. Los demás errores
+    (cuota, red...) se propagan: repetir mensaje a mensaje solo multiplicaría
+    las peticiones contra una cuota ya agotada.
+    
+    Args:
+        mensajes (list of str): Mensajes del lote.
+        modelo (genai.GenerativeModel): Modelo de extracción a usar.
+        semaforo (asyncio.Semaphore): Límite de peticiones en vuelo.
+        cerrojo (asyncio.Lock): Cerrojo de la ventana de peticiones por minuto.
+    
+    Returns:
+        list of dict: Campos extraídos, en el mismo orden que los mensajes.
+        En el reintento mensaje a mensaje, los que fallan quedan como None.
+    """
+    if len(mensajes) == 1:
+        return [await extraer_campos_con_llm_async(mensajes[0], modelo, semaforo, cerrojo)]
+
+    prompt = crear_prompt_extraccion_batch(mensajes, incluir_instrucciones=False)
+    texto_respuesta = ""
+
+    # El semáforo se libera antes del reintento individual, que lo vuelve a pedir.
+    async with semaforo:
+        try:
+            await esperar_turno_gemini(cerrojo)
+            response = await modelo.generate_content_async(
+                prompt, generation_config=CONFIG_GENERACION_LOTE
+            )
+            texto_respuesta = response.text.strip()
+            return procesar_respuesta_llm_lote(texto_respuesta, len(mensajes))
+
+        except (json.JSONDecodeError, ValueError) as e:
+            print(f"Error: respuesta del lote no válida, se procesará mensaje a mensaje: {e}")
             if DEBUG:
-                print("Campos extraídos correctamente:")
-                for campo, valor in datos_extraidos.items():
-                    print(f"   {campo}: {valor}")
+                print(f"Respuesta recibida: {texto_respuesta}")
+
+    tareas = [extraer_campos_con_llm_async(mensaje, modelo, semaforo, cerrojo) for mensaje in mensajes]
+    resultados = await asyncio.gather(*tareas, return_exceptions=True)
+    return [None if isinstance(resultado, Exception) else resultado for resultado in resultados]
 
-            return datos_extraidos
 
+async def extraer_campos_concurrente(mensajes, modelo, tamano_lote=LOTE_MENSAJES_LLM):
+    """
+    Divide los mensajes en lotes y lanza todos los lotes a la vez con asyncio.gather.
+    
+    Args:
+        mensajes (list of str): Mensajes a procesar.
+        modelo (genai.GenerativeModel): Modelo de extracción a usar.
+        tamano_lote (int): Número máximo de mensajes por petición.
+    
+    Returns:
+        list of dict: Campos extraídos, en el mismo orden que los mensajes.
+        Los mensajes de los lotes que fallaron quedan como None.
+    """
+    semaforo = asyncio.Semaphore(GEMINI_MAX_CONCURRENCIA)
+    cerrojo = asyncio.Lock()
+    lotes = [mensajes[i:i + tamano_lote] for i in range(0, len(mensajes), tamano_lote)]
+    tareas = [extraer_campos_lote_async(lote, modelo, semaforo, cerrojo) for lote in lotes]
+    resultados = await asyncio.gather(*tareas, return_exceptions=True)
+
+    campos = []
+    for lote, resultado in zip(lotes, resultados):
+        if isinstance(resultado, list):
+            campos.extend(resultado)
         else:
-            raise json.JSONDecodeError("No se encontró un JSON válido en la respuesta", texto_respuesta, 0)
+            print(f"Error al procesar el lote con Gemini: {resultado}")
+            campos.extend(None for _ in lote)
+    return campos
 
-    except json.JSONDecodeError as e:
-        print(f"Error: la respuesta del modelo no es JSON válido: {e}")
-        if DEBUG:
-            print(f"Respuesta recibida: {texto_respuesta}")
-        return {}
 
+def ejecutar_en_bucle_llm(corrutina):
+    """
+    Ejecuta una corrutina en un bucle de eventos persistente.
+    El cliente asíncrono de Gemini queda ligado al bucle en el que se crea,
+    por lo que se reutiliza siempre el mismo en lugar de usar asyncio.run().
+    
+    Args:
+        corrutina: Corrutina a ejecutar.
+    
+    Returns:
+        Resultado de la corrutina.
+    """
+    global _BUCLE_LLM
+    if _BUCLE_LLM is None or _BUCLE_LLM.is_closed():
+        _BUCLE_LLM = asyncio.new_event_loop()
+    return _BUCLE_LLM.run_until_complete(corrutina)
+
+
+def extraer_campos_con_llm_batch(mensajes, tamano_lote=LOTE_MENSAJES_LLM):
+    """
+    Extrae los campos estructurados de varios mensajes agrupándolos en lotes
+    de tamano_lote mensajes por prompt, de modo que las instrucciones y la
+    latencia de red se pagan una vez por lote. Los lotes se envían a Gemini
+    de forma concurrente, respetando el límite de peticiones por minuto.
+    Si la ejecución asíncrona falla, procesa los mensajes uno a uno.
+    
+    Args:
+        mensajes (list of str): Mensajes a procesar.
+        tamano_lote (int): Número máximo de mensajes por petición.
+    
+    Returns:
+        list of dict: Campos extraídos, en el mismo orden que los mensajes.
+        Los mensajes cuya extracción falló quedan como None.
+    """
+    if not mensajes:
+        return []
+
+    if DEBUG:
+        lotes = -(-len(mensajes) // tamano_lote)
+        print(f"Enviando {len(mensajes)} mensajes a Gemini en {lotes} lotes concurrentes...")
+
+    # Se resuelve una sola vez y fuera del bucle de eventos, ya que puede
+    # bloquear al crear o renovar la caché de contexto.
+    modelo = obtener_modelo_extraccion()
+
+    try:
+        return ejecutar_en_bucle_llm(extraer_campos_concurrente(mensajes, modelo, tamano_lote))
     except Exception as e:
-        print(f"Error inesperado al procesar con el modelo Gemini: {e}")
-        return {}
+        print(f"Error en la extracción concurrente, se procesará secuencialmente: {e}")
+        return [extraer_campos_con_llm(mensaje) for mensaje in mensajes]
 
 
 # ============================================================================
 # MÓDULO AUTOMATIZACIÓN WHATSAPP (SELENIUM)
 # ============================================================================
 
+_RUTA_CHROMEDRIVER = None
+
+
+def obtener_ruta_chromedriver(forzar_descarga=False):
+    """
+    Devuelve la ruta del ejecutable de ChromeDriver.
+    ChromeDriverManager().install() consulta por red la última versión en cada
+    llamada, así que su resultado se guarda en memoria y en disco
+    (RUTA_CACHE_CHROMEDRIVER) y solo se vuelve a resolver cuando la ruta
+    guardada tiene más de DIAS_VALIDEZ_CHROMEDRIVER días o ya no existe.
+    
+    Args:
+        forzar_descarga (bool): Si es True, descarta ambas cachés y vuelve a
+            resolver el driver (por ejemplo, tras una actualización de Chrome).
+    
+    Returns:
+        str: Ruta al ejecutable de ChromeDriver.
+    """
+    global _RUTA_CHROMEDRIVER
+    if forzar_descarga:
+        _RUTA_CHROMEDRIVER = None
+        try:
+            os.remove(RUTA_CACHE_CHROMEDRIVER)
+        except OSError:
+            pass
+
+    if _RUTA_CHROMEDRIVER and os.path.exists(_RUTA_CHROMEDRIVER):
+        return _RUTA_CHROMEDRIVER
+
+    try:
+        antiguedad = time.time() - os.path.getmtime(RUTA_CACHE_CHROMEDRIVER)
+        if antiguedad < DIAS_VALIDEZ_CHROMEDRIVER * 24 * 3600:
+            with open(RUTA_CACHE_CHROMEDRIVER, encoding="utf-8") as archivo:
+                ruta = archivo.read().strip()
+            if ruta and os.path.exists(ruta):
+                _RUTA_CHROMEDRIVER = ruta
+                return ruta
+    except OSError:
+        pass
+
+    ruta = ChromeDriverManager().install()
+    try:
+        os.makedirs(os.path.dirname(RUTA_CACHE_CHROMEDRIVER), exist_ok=True)
+        with open(RUTA_CACHE_CHROMEDRIVER, "w", encoding="utf-8") as archivo:
+            archivo.write(ruta)
+    except OSError as e:
+        if DEBUG:
+            print(f"No se pudo guardar la ruta de ChromeDriver en caché: {e}")
+
+    _RUTA_CHROMEDRIVER = ruta
+    return ruta
+
+
 def inicializar_navegador():
     """
     Configura e inicializa el navegador Chrome con las opciones necesarias
     para automatizar WhatsApp Web mediante Selenium.
     
+    Por defecto Chrome se ejecuta sin interfaz (MODO_HEADLESS) y sin GPU,
+    extensiones, imágenes ni red en segundo plano: para leer y escribir texto
+    en WhatsApp Web no hacen falta y consumen buena parte de la RAM y la CPU.
+    
     Returns:
         selenium.webdriver.Chrome: Instancia del navegador configurada.
     """
@@ -408,10 +1128,36 @@ def inicializar_navegador():
     opciones.add_argument("--disable-dev-shm-usage")
     opciones.add_argument("--disable-web-security")
     opciones.add_argument("--disable-features=VizDisplayCompositor")
+    opciones.add_argument("--window-size=1200,800")
+    opciones.add_argument("--disable-gpu")
+    opciones.add_argument("--disable-extensions")
+    opciones.add_argument("--disable-background-networking")
+    opciones.add_argument("--blink-settings=imagesEnabled=false")
+    opciones.add_argument("--autoplay-policy=user-gesture-required")
+    opciones.add_experimental_option("prefs", {
+        "profile.default_content_setting_values.notifications": 2,
+        "profile.managed_default_content_settings.images": 2,
+    })
+    if MODO_HEADLESS:
+        opciones.add_argument("--headless=new")
 
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=opciones)
-    driver.set_window_size(1200, 800)
+    try:
+        service = Service(obtener_ruta_chromedriver())
+        driver = webdriver.Chrome(service=service, options=opciones)
+    except SessionNotCreatedException as e:
+        # Si Chrome se ha actualizado, el ChromeDriver guardado en caché ya no
+        # es compatible: se descarga de nuevo y se reintenta una vez.
+        print(f"No se pudo iniciar Chrome con el ChromeDriver en caché, se descargará de nuevo: {e.msg}")
+        service = Service(obtener_ruta_chromedriver(forzar_descarga=True))
+        driver = webdriver.Chrome(service=service, options=opciones)
+
+    if MODO_HEADLESS:
+        # WhatsApp Web rechaza los navegadores que se identifican como
+        # "HeadlessChrome"; se usa el mismo user agent sin ese sufijo.
+        user_agent = driver.execute_script("return navigator.userAgent")
+        driver.execute_cdp_cmd("Network.setUserAgentOverride", {
+            "userAgent": user_agent.replace("HeadlessChrome", "Chrome")
+        })
 
     if DEBUG:
         print("Navegador Chrome inicializado correctamente.")
@@ -419,6 +1165,87 @@ def inicializar_navegador():
     return driver
 
 
+_NAVEGADOR = None
+_LOCK_NAVEGADOR = threading.Lock()
+
+
+def navegador_responde(driver):
+    """
+    Comprueba que la sesión de WebDriver sigue viva con una orden barata.
+    
+    Args:
+        driver (webdriver.Chrome): Instancia del navegador.
+    
+    Returns:
+        bool: True si el navegador responde, False si la sesión se ha perdido
+        (Chrome cerrado, ChromeDriver caído o sesión inválida).
+    """
+    try:
+        driver.current_url
+        return True
+    except WebDriverException:
+        return False
+
+
+def obtener_navegador():
+    """
+    Devuelve el navegador compartido con WhatsApp Web ya abierto.
+    La primera llamada inicializa Chrome y carga WhatsApp Web; las siguientes
+    reutilizan la misma sesión, evitando arrancar el navegador y esperar la
+    carga de WhatsApp Web en cada tarea programada. Si la sesión guardada ya
+    no responde, se descarta y se abre un navegador nuevo.
+    
+    Returns:
+        selenium.webdriver.Chrome: Instancia del navegador compartida.
+    """
+    global _NAVEGADOR
+    with _LOCK_NAVEGADOR:
+        if _NAVEGADOR is not None and not navegador_responde(_NAVEGADOR):
+            print("La sesión del navegador no responde. Reiniciando navegador...")
+            try:
+                _NAVEGADOR.quit()
+            except WebDriverException:
+                pass
+            _NAVEGADOR = None
+
+        if _NAVEGADOR is None:
+            driver = inicializar_navegador()
+            try:
+                abrir_whatsapp_web(driver)
+            except Exception:
+                driver.quit()
+                raise
+            _NAVEGADOR = driver
+        return _NAVEGADOR
+
+
+def cerrar_navegador():
+    """
+    Cierra el navegador compartido, si está abierto.
+    Se registra con atexit y también se usa para descartar una sesión que ha
+    fallado, de modo que la siguiente tarea arranque un navegador nuevo.
+    """
+    global _NAVEGADOR
+    with _LOCK_NAVEGADOR:
+        if _NAVEGADOR is not None:
+            try:
+                _NAVEGADOR.quit()
+            except Exception as e:
+                if DEBUG:
+                    print(f"Error al cerrar el navegador: {e}")
+            _NAVEGADOR = None
+            print("Navegador cerrado.")
+
+
+atexit.register(cerrar_navegador)
+
+
+LOCALIZADOR_QR = (By.XPATH, "//div[@data-ref and contains(@data-ref, 'qr')]")
+LOCALIZADOR_PANEL_CHATS = (By.XPATH, "//div[@id='pane-side']")
+LOCALIZADOR_BOTON_CANALES = (By.XPATH, "//span[@data-icon='newsletter-outline']/ancestor::button")
+LOCALIZADOR_BUSCADOR = (By.CSS_SELECTOR, "div[contenteditable='true'][role='textbox']:not(footer *)")
+
+
 def abrir_whatsapp_web(driver):
     """
     Navega a WhatsApp Web y espera a que cargue completamente.
@@ -426,19 +1253,38 @@ def abrir_whatsapp_web(driver):
     
     Args:
         driver (webdriver.Chrome): Instancia del navegador.
+    
+    Raises:
+        TimeoutException: Si WhatsApp Web no carga o no se inicia sesión a tiempo.
     """
     print("Abriendo WhatsApp Web...")
     driver.get("https://web.whatsapp.com")
-    time.sleep(50)
 
-    try:
-        qr_code = driver.find_element(By.XPATH, "//div[@data-ref and contains(@data-ref, 'qr')]")
-        if qr_code:
-            print("Se requiere escanear el código QR para iniciar sesión.")
-            input("Presione Enter después de escanear el código QR en su teléfono...")
-            time.sleep(50)
-    except NoSuchElementException:
+    try:
+        # Se continúa en cuanto aparece el código QR o la lista de chats,
+        # en lugar de esperar siempre un tiempo fijo.
+        elemento = WebDriverWait(driver, 60).until(EC.any_of(
+            EC.presence_of_element_located(LOCALIZADOR_QR),
+            EC.presence_of_element_located(LOCALIZADOR_PANEL_CHATS)
+        ))
+    except TimeoutException:
+        raise TimeoutException("WhatsApp Web no terminó de cargar a tiempo.")
+
+    if elemento.get_attribute("id") == "pane-side":
         print("Sesión activa detectada en WhatsApp Web.")
+        return
+
+    print("Se requiere escanear el código QR para iniciar sesión.")
+    if MODO_HEADLESS:
+        elemento.screenshot(RUTA_CAPTURA_QR)
+        print(f"Código QR guardado en: {RUTA_CAPTURA_QR}")
+    input("Presione Enter después de escanear el código QR en su teléfono...")
+
+    try:
+        WebDriverWait(driver, 120).until(EC.presence_of_element_located(LOCALIZADOR_PANEL_CHATS))
+        print("Sesión iniciada en WhatsApp Web.")
+    except TimeoutException:
+        raise TimeoutException("No se detectó la lista de chats tras escanear el código QR.")
 
 
 def navegar_a_seccion_canales(driver):
@@ -454,21 +1300,85 @@ def navegar_a_seccion_canales(driver):
     """
     try:
         print("Navegando a la sección de Canales...")
-        boton_canales = driver.find_element(
-            By.XPATH, 
-            "//span[@data-icon='newsletter-outline']/ancestor::button"
+        boton_canales = WebDriverWait(driver, 60).until(
+            EC.element_to_be_clickable(LOCALIZADOR_BOTON_CANALES)
         )
         boton_canales.click()
-        time.sleep(50)
         print("Sección de canales abierta correctamente.")
         return True
 
-    except NoSuchElementException:
+    except TimeoutException:
         print("No se encontró la sección de Canales en la interfaz actual.")
         print("Verifique que la función de Canales esté habilitada en su cuenta.")
         return False
 
 
+SCRIPT_BUSCAR_CANAL = """
+const nombre = arguments[0];
+const elementos = Array.from(document.querySelectorAll('span[title]'));
+const elemento = elementos.find(e => e.title === nombre)
+    || elementos.find(e => e.title.includes(nombre));
+return elemento ? (elemento.closest('[role="listitem"]') || elemento) : null;
+"""
+
+
+def buscar_elemento_canal(driver, nombre_canal):
+    """
+    Localiza el elemento de un canal en la lista lateral por su atributo title.
+    WhatsApp Web expone el nombre de cada chat o canal en ese atributo, así que
+    basta con filtrar los span[title] en el navegador con una sola llamada, en
+    lugar de recorrer el texto de todos los span con XPath. El nombre se pasa
+    como argumento del script, por lo que las comillas no rompen la búsqueda.
+    
+    Args:
+        driver (webdriver.Chrome): Instancia del navegador.
+        nombre_canal (str): Nombre del canal a buscar.
+    
+    Returns:
+        WebElement | None: Fila del canal en la lista (coincidencia exacta
+        preferente) o None si no aparece en ella.
+    """
+    return driver.execute_script(SCRIPT_BUSCAR_CANAL, nombre_canal)
+
+
+def buscar_canal_con_buscador(driver, nombre_canal):
+    """
+    Escribe el nombre del canal en el buscador de la barra lateral y espera a
+    que aparezca entre los resultados. Se usa cuando el canal no está
+    renderizado en la lista visible (por ejemplo, si hay muchos canales).
+    
+    Args:
+        driver (webdriver.Chrome): Instancia del navegador.
+        nombre_canal (str): Nombre del canal a buscar.
+    
+    Returns:
+        WebElement: Fila del canal en los resultados de búsqueda.
+    
+    Raises:
+        TimeoutException: Si no aparece el buscador o el canal en los resultados.
+    """
+    buscador = WebDriverWait(driver, 10).until(EC.element_to_be_clickable(LOCALIZADOR_BUSCADOR))
+    buscador.click()
+    vaciar_caja_texto(buscador)
+    buscador.send_keys(nombre_canal)
+    return WebDriverWait(driver, 15).until(lambda d: buscar_elemento_canal(d, nombre_canal))
+
+
+def limpiar_buscador(driver):
+    """
+    Vacía el buscador de la barra lateral para que la lista de canales vuelva
+    a mostrarse completa. Un fallo aquí no impide usar el canal ya abierto.
+    
+    Args:
+        driver (webdriver.Chrome): Instancia del navegador.
+    """
+    try:
+        vaciar_caja_texto(driver.find_element(*LOCALIZADOR_BUSCADOR))
+    except WebDriverException as e:
+        if DEBUG:
+            print(f"No se pudo vaciar el buscador: {e.msg}")
+
+
 def abrir_canal_especifico(driver, nombre_canal):
     """
     Busca y abre un canal específico por su nombre.
@@ -482,12 +1392,34 @@ def abrir_canal_especifico(driver, nombre_canal):
     """
     try:
         print(f"Buscando el canal: {nombre_canal}")
-        elemento_canal = driver.find_element(
-            By.XPATH,
-            f"//span[contains(text(), '{nombre_canal}')]"
-        )
+        # La lista de canales se renderiza tras abrir la sección; se espera
+        # poco a que el canal aparezca en ella, ya que si no está renderizado
+        # no aparecerá por mucho que se espere y el buscador lo encontrará.
+        usado_buscador = False
+        try:
+            elemento_canal = WebDriverWait(driver, 5).until(
+                lambda d: buscar_elemento_canal(d, nombre_canal)
+            )
+        except TimeoutException:
+            if DEBUG:
+                print("El canal no aparece en la lista visible. Probando con el buscador...")
+            try:
+                elemento_canal = buscar_canal_con_buscador(driver, nombre_canal)
+                usado_buscador = True
+            except TimeoutException:
+                limpiar_buscador(driver)
+                raise NoSuchElementException(nombre_canal)
         elemento_canal.click()
-        time.sleep(50)
+        # El filtro del buscador se queda aplicado en la barra lateral y
+        # ocultaría los demás canales en las siguientes búsquedas.
+        if usado_buscador:
+            limpiar_buscador(driver)
+
+        # En lugar de una espera fija, se continúa en cuanto la cabecera de la
+        # conversación muestra el canal seleccionado.
+        WebDriverWait(driver, 30).until(
+            EC.text_to_be_present_in_element((By.CSS_SELECTOR, "#main header"), nombre_canal)
+        )
         print(f"Canal '{nombre_canal}' abierto correctamente.")
         return True
 
@@ -496,10 +1428,37 @@ def abrir_canal_especifico(driver, nombre_canal):
         print("Verifique que el nombre sea correcto y que tenga acceso al canal.")
         return False
 
+    except TimeoutException:
+        print(f"El canal '{nombre_canal}' no terminó de cargar a tiempo.")
+        return False
+
+
+SELECTORES_MENSAJE = (
+    "div.copyable-text",
+    "div[data-pre-plain-text]",
+    "span.selectable-text"
+)
+
+# Devuelve los textos del primer selector que encuentre mensajes, ya
+# recortados y filtrados, en una sola llamada al navegador.
+SCRIPT_EXTRAER_MENSAJES = """
+for (const selector of arguments[0]) {
+    const textos = Array.from(document.querySelectorAll(selector), e => (e.innerText || '').trim())
+        .filter(t => t.length > 0);
+    if (textos.length) {
+        return textos.filter(t => t.length > arguments[1]);
+    }
+}
+return [];
+"""
+
 
 def extraer_mensajes_visibles(driver):
     """
     Extrae todos los mensajes visibles en la pantalla actual del canal.
+    Todos los selectores se prueban en el navegador con una única llamada
+    execute_script, en lugar de una llamada por selector y por elemento.
+    Los mensajes repetidos en pantalla se devuelven una sola vez.
     
     Args:
         driver (webdriver.Chrome): Instancia del navegador.
@@ -510,23 +1469,8 @@ def extraer_mensajes_visibles(driver):
     try:
         print("Extrayendo mensajes visibles en pantalla...")
 
-        selectores_mensaje = [
-            "//div[contains(@class, 'copyable-text')]",
-            "//div[@data-pre-plain-text]",
-            "//span[contains(@class, 'selectable-text')]"
-        ]
-
-        mensajes_encontrados = []
-        for selector in selectores_mensaje:
-            try:
-                elementos = driver.find_elements(By.XPATH, selector)
-                if elementos:
-                    mensajes_encontrados = [elem.text.strip() for elem in elementos if elem.text.strip()]
-                    break
-            except:
-                continue
-
-        mensajes_validos = [msg for msg in mensajes_encontrados if len(msg) > 10]
+        textos = driver.execute_script(SCRIPT_EXTRAER_MENSAJES, list(SELECTORES_MENSAJE), 10)
+        mensajes_validos = list(dict.fromkeys(textos or []))
 
         if DEBUG:
             print(f"Se encontraron {len(mensajes_validos)} mensajes válidos en la pantalla actual.")
@@ -538,49 +1482,265 @@ def extraer_mensajes_visibles(driver):
         return []
 
 
+# Devuelve el último mensaje saliente del chat abierto y si ya muestra la
+# marca de enviado, o [null, false] si no hay ninguno renderizado.
+SCRIPT_ULTIMO_MENSAJE_SALIENTE = """
+const salientes = document.querySelectorAll('div.message-out');
+if (!salientes.length) {
+    return [null, false];
+}
+const ultimo = salientes[salientes.length - 1];
+const marca = ultimo.querySelector("span[data-icon='msg-check'], span[data-icon='msg-dblcheck']");
+return [ultimo, marca !== null];
+"""
+
+# Resultados posibles de escribir_mensaje_en_chat().
+ENVIO_CONFIRMADO = "confirmado"        # WhatsApp mostró la marca de enviado
+ENVIO_SIN_CONFIRMAR = "sin_confirmar"  # Se pulsó Enter pero no apareció la marca a tiempo
+ENVIO_FALLIDO = "fallido"              # No se pudo escribir o enviar el mensaje
+
+
+def lineas_no_vacias(texto):
+    """
+    Divide un texto en líneas recortadas, descartando las vacías.
+    
+    Args:
+        texto (str): Texto a dividir.
+    
+    Returns:
+        list of str: Líneas con contenido.
+    """
+    return [linea.strip() for linea in texto.splitlines() if linea.strip()]
+
+
+def caja_contiene_texto(driver, caja_texto, texto_mensaje):
+    """
+    Comprueba que la caja de mensaje contiene exactamente el texto, línea a
+    línea. Se lee innerText, que refleja los saltos de línea del editor, para
+    detectar que se han perdido los saltos aunque las palabras coincidan.
+    
+    Args:
+        driver (webdriver.Chrome): Instancia del navegador.
+        caja_texto (WebElement): Caja de texto del chat activo.
+        texto_mensaje (str): Texto que debería contener la caja.
+    
+    Returns:
+        bool: True si las líneas de la caja coinciden con las del texto.
+    """
+    contenido = driver.execute_script("return arguments[0].innerText;", caja_texto) or ""
+    return lineas_no_vacias(contenido) == lineas_no_vacias(texto_mensaje)
+
+
+def insertar_texto_en_caja(driver, caja_texto, texto_mensaje):
+    """
+    Inserta el texto completo en la caja de mensaje con una única orden CDP
+    (Input.insertText), en lugar de una llamada send_keys por línea.
+    Comprueba después que el contenido de la caja coincide con el texto,
+    incluidos los saltos de línea.
+    
+    Args:
+        driver (webdriver.Chrome): Instancia del navegador.
+        caja_texto (WebElement): Caja de texto del chat activo.
+        texto_mensaje (str): Texto completo del mensaje.
+    
+    Returns:
+        bool: True si el texto quedó escrito correctamente, False en caso contrario.
+    """
+    try:
+        driver.execute_script("arguments[0].focus();", caja_texto)
+        driver.execute_cdp_cmd("Input.insertText", {"text": texto_mensaje})
+        return caja_contiene_texto(driver, caja_texto, texto_mensaje)
+
+    except Exception as e:
+        if DEBUG:
+            print(f"No se pudo insertar el texto mediante CDP: {e}")
+        return False
+
+
+SCRIPT_PEGAR_TEXTO = """
+const caja = arguments[0];
+const datos = new DataTransfer();
+datos.setData('text/plain', arguments[1]);
+caja.focus();
+caja.dispatchEvent(new ClipboardEvent('paste', {
+    clipboardData: datos, bubbles: true, cancelable: true
+}));
+"""
+
+
+def pegar_texto_en_caja(driver, caja_texto, texto_mensaje):
+    """
+    Pega el texto completo en la caja de mensaje disparando un evento paste
+    sintético con el texto en su DataTransfer. El editor de WhatsApp Web lo
+    trata como un pegado del portapapeles y conserva los saltos de línea, sin
+    depender de los permisos del portapapeles del sistema.
+    
+    Args:
+        driver (webdriver.Chrome): Instancia del navegador.
+        caja_texto (WebElement): Caja de texto del chat activo.
+        texto_mensaje (str): Texto completo del mensaje.
+    
+    Returns:
+        bool: True si el texto quedó escrito correctamente, False en caso contrario.
+    """
+    try:
+        driver.execute_script(SCRIPT_PEGAR_TEXTO, caja_texto, texto_mensaje)
+        return caja_contiene_texto(driver, caja_texto, texto_mensaje)
+
+    except Exception as e:
+        if DEBUG:
+            print(f"No se pudo pegar el texto en la caja: {e}")
+        return False
+
+
+def vaciar_caja_texto(caja_texto):
+    """
+    Borra el contenido de la caja de mensaje antes de reintentar la escritura.
+    
+    Args:
+        caja_texto (WebElement): Caja de texto del chat activo.
+    """
+    caja_texto.send_keys(Keys.CONTROL, "a")
+    caja_texto.send_keys(Keys.BACKSPACE)
+
+
+def escribir_texto_por_lineas(driver, caja_texto, texto_mensaje):
+    """
+    Escribe el texto tecleándolo, usando Shift+Enter como salto de línea.
+    Todas las líneas se encadenan en una sola ActionChains que se ejecuta con
+    un único perform(), en lugar de una orden al navegador por línea.
+    Es el método lento, usado solo si fallan insertar_texto_en_caja() y
+    pegar_texto_en_caja().
+    
+    Args:
+        driver (webdriver.Chrome): Instancia del navegador.
+        caja_texto (WebElement): Caja de texto del chat activo.
+        texto_mensaje (str): Texto completo del mensaje.
+    """
+    from selenium.webdriver.common.action_chains import ActionChains
+    acciones = ActionChains(driver).click(caja_texto)
+
+    for numero, linea in enumerate(texto_mensaje.splitlines()):
+        if numero:
+            acciones.key_down(Keys.SHIFT).send_keys(Keys.ENTER).key_up(Keys.SHIFT)
+        if linea:
+            acciones.send_keys(linea)
+
+    acciones.perform()
+
+
 def escribir_mensaje_en_chat(driver, texto_mensaje):
     """
     Escribe y envía un mensaje en el chat activo de WhatsApp Web.
-    Usa Shift+Enter para respetar saltos de línea sin enviar el mensaje antes de tiempo.
+    El texto se inserta de una sola vez (inserción CDP o, si falla, un pegado
+    sintético); si ninguna funciona, se escribe línea a línea usando
+    Shift+Enter para no enviar el mensaje antes de tiempo.
+    Tras enviarlo espera a que el último mensaje saliente del chat sea uno
+    nuevo y muestre la marca de enviado, en lugar de una pausa fija.
     
     Args:
         driver (webdriver.Chrome): Instancia del navegador.
         texto_mensaje (str): Texto completo del mensaje a enviar.
     
     Returns:
-        bool: True si el mensaje se envió correctamente, False en caso de error.
+        str: ENVIO_CONFIRMADO si apareció la marca de enviado,
+        ENVIO_SIN_CONFIRMAR si no apareció a tiempo (el mensaje puede no
+        haber salido) o ENVIO_FALLIDO si no se pudo enviar.
     """
     try:
-        caja_texto = driver.find_element(
-            By.XPATH,
-            "//footer//div[@contenteditable='true']"
+        caja_texto = WebDriverWait(driver, 10).until(
+            EC.element_to_be_clickable((By.XPATH, "//footer//div[@contenteditable='true']"))
         )
         caja_texto.click()
-        time.sleep(1)
-
-        from selenium.webdriver.common.action_chains import ActionChains
-        acciones = ActionChains(driver)
 
-        for linea in texto_mensaje.splitlines():
-            caja_texto.send_keys(linea)
-            acciones.key_down(Keys.SHIFT).send_keys(Keys.ENTER).key_up(Keys.SHIFT).perform()
-            time.sleep(0.1)
+        if not insertar_texto_en_caja(driver, caja_texto, texto_mensaje):
+            if DEBUG:
+                print("La inserción directa no se aplicó correctamente. Probando a pegar el texto...")
+            vaciar_caja_texto(caja_texto)
 
+            if not pegar_texto_en_caja(driver, caja_texto, texto_mensaje):
+                if DEBUG:
+                    print("El pegado no se aplicó correctamente. Escribiendo línea a línea...")
+                vaciar_caja_texto(caja_texto)
+                escribir_texto_por_lineas(driver, caja_texto, texto_mensaje)
+
+        # Se mira solo la marca del último mensaje saliente: un conteo de marcas
+        # en toda la página cambia cuando un mensaje anterior pasa del reloj al
+        # tick o cuando WhatsApp deja de renderizar mensajes antiguos.
+        ultimo_previo, _ = driver.execute_script(SCRIPT_ULTIMO_MENSAJE_SALIENTE)
         caja_texto.send_keys(Keys.ENTER)
-        time.sleep(2)
+
+        def mensaje_nuevo_confirmado(d):
+            ultimo, confirmado = d.execute_script(SCRIPT_ULTIMO_MENSAJE_SALIENTE)
+            return ultimo is not None and ultimo != ultimo_previo and confirmado
+
+        try:
+            WebDriverWait(driver, 5).until(mensaje_nuevo_confirmado)
+        except TimeoutException:
+            print("No se detectó la confirmación de envío; el mensaje puede seguir pendiente.")
+            return ENVIO_SIN_CONFIRMAR
 
         if DEBUG:
             print("Mensaje enviado correctamente al chat activo.")
-        return True
+        return ENVIO_CONFIRMADO
 
-    except NoSuchElementException:
+    except (NoSuchElementException, TimeoutException):
         print("No se encontró la caja de texto para escribir el mensaje.")
-        return False
+        return ENVIO_FALLIDO
 
     except Exception as e:
         print(f"Error al enviar mensaje: {e}")
+        return ENVIO_FALLIDO
+
+
+class SesionWhatsApp:
+    """
+    Sesión de WhatsApp Web compartida por todas las tareas del bot.
+    Envuelve el navegador compartido (obtener_navegador) para que scraping,
+    envío y resumen reutilicen el mismo Chrome ya autenticado en lugar de
+    arrancar uno nuevo y esperar la carga de WhatsApp Web en cada tarea.
+    El navegador se abre en el primer uso y se cierra al salir del bloque with.
+    """
+
+    @property
+    def driver(self):
+        """selenium.webdriver.Chrome: Navegador con WhatsApp Web abierto."""
+        return obtener_navegador()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo_excepcion, excepcion, traza):
+        cerrar_navegador()
         return False
 
+    def ir_a_canales(self):
+        """Abre la sección de Canales. Devuelve True si se consiguió."""
+        return navegar_a_seccion_canales(self.driver)
+
+    def abrir_canal(self, nombre_canal):
+        """Abre el canal indicado. Devuelve True si se consiguió."""
+        return abrir_canal_especifico(self.driver, nombre_canal)
+
+    def extraer_visibles(self):
+        """Devuelve los textos de los mensajes visibles del canal abierto."""
+        return extraer_mensajes_visibles(self.driver)
+
+    def enviar_mensaje(self, texto_mensaje):
+        """
+        Envía un mensaje al chat abierto. Devuelve ENVIO_CONFIRMADO,
+        ENVIO_SIN_CONFIRMAR o ENVIO_FALLIDO (ver escribir_mensaje_en_chat).
+        """
+        return escribir_mensaje_en_chat(self.driver, texto_mensaje)
+
+    def reiniciar(self):
+        """
+        Descarta el navegador tras un error (por ejemplo, elementos obsoletos
+        o una sesión caída); la siguiente operación abrirá uno nuevo.
+        """
+        cerrar_navegador()
+
+
 # ============================================================================
 # FUNCIONES PRINCIPALES DEL SISTEMA
 # ============================================================================
@@ -599,7 +1759,7 @@ def scraping_hasta_no_haber_nuevos(max_intentos=5, espera_segundos=3):
     nuevos_mensajes = True
 
     while nuevos_mensajes and intentos < max_intentos:
-        mensajes_antes = len(obtener_mensajes_del_dia())
+        mensajes_antes = contar_mensajes_del_dia()
         print(f"Intento #{intentos + 1} - Mensajes actuales: {mensajes_antes}")
         
         exito = ejecutar_scraping_completo()
@@ -608,117 +1768,218 @@ def scraping_hasta_no_haber_nuevos(max_intentos=5, espera_segundos=3):
             break
 
         time.sleep(espera_segundos)
-        mensajes_despues = len(obtener_mensajes_del_dia())
+        mensajes_despues = contar_mensajes_del_dia()
         nuevos_mensajes = mensajes_despues > mensajes_antes
         intentos += 1
 
     print("Scraping finalizado: no se detectan más mensajes nuevos.")
 
 
-def ejecutar_scraping_completo():
+def filtrar_mensajes_nuevos(mensajes, hashes_leidos):
+    """
+    Recorre una sola vez los mensajes extraídos de un canal: descarta los ya
+    vistos en este proceso, calcula el hash de los demás y descarta los que
+    ya aparecieron en otro canal durante la misma pasada.
+    
+    Args:
+        mensajes (list of str): Mensajes extraídos del canal.
+        hashes_leidos (set of str): Hashes ya leídos en esta pasada; se
+            actualiza con los nuevos.
+    
+    Yields:
+        tuple: (hash_mensaje, mensaje) de cada mensaje no visto.
+    """
+    for mensaje in mensajes:
+        if mensaje_visto(mensaje):
+            continue
+        hash_mensaje = generar_hash_mensaje(mensaje)
+        if hash_mensaje in hashes_leidos:
+            continue
+        hashes_leidos.add(hash_mensaje)
+        yield hash_mensaje, mensaje
+
+
+def guardar_resultados_llm(trabajos_llm):
+    """
+    Guarda en la base de datos los mensajes cuya extracción con el LLM ha
+    terminado, con una única inserción. Los trabajos y mensajes cuya
+    extracción falló se omiten, para reintentarlos en la siguiente pasada.
+    
+    Args:
+        trabajos_llm (list of tuple): Tuplas (canal, pendientes, futuro), donde
+            pendientes son pares (hash_mensaje, mensaje) y futuro devuelve los
+            campos extraídos en el mismo orden.
+    
+    Returns:
+        int: Número de mensajes realmente insertados.
+    """
+    filas_nuevas = []
+    for canal, pendientes, futuro in trabajos_llm:
+        if futuro.cancelled() or futuro.exception() is not None:
+            print(f"Error en la extracción con el LLM del canal {canal}.")
+            continue
+
+        for (hash_mensaje, mensaje), campos_extraidos in zip(pendientes, futuro.result()):
+            if campos_extraidos is None:
+                continue
+
+            try:
+                filas_nuevas.append(
+                    preparar_fila_mensaje(mensaje, canal, campos_extraidos, hash_mensaje)
+                )
+
+            except Exception as e:
+                print(f"Error procesando mensaje: {e}")
+                continue
+
+    mensajes_nuevos = insertar_mensajes_bd_bulk(filas_nuevas)
+    # Si el lote falló no se marcan, para reintentarlos en la siguiente pasada.
+    if mensajes_nuevos == len(filas_nuevas):
+        registrar_mensajes_vistos(fila[1] for fila in filas_nuevas)
+    return mensajes_nuevos
+
+
+def ejecutar_scraping_completo(sesion=None):
     """
     Función principal que coordina todo el proceso de scraping.
-    Incluye la conexión a WhatsApp Web, navegación, extracción de mensajes,
-    procesamiento con el LLM y almacenamiento en la base de datos.
+    Incluye la conexión a WhatsApp Web, navegación, extracción de mensajes
+    de cada canal de CANALES_ORIGEN, procesamiento con el LLM y
+    almacenamiento en la base de datos.
+    
+    Args:
+        sesion (SesionWhatsApp, optional): Sesión a reutilizar. Por defecto
+            se usa la sesión compartida.
     
     Returns:
         bool: True si el scraping se completó con éxito, False si hubo errores.
     """
     print("===== INICIANDO PROCESO DE SCRAPING =====")
     crear_tabla_mensajes()
+    sesion = sesion or SesionWhatsApp()
 
-    driver = inicializar_navegador()
-    
     try:
-        abrir_whatsapp_web(driver)
-
-        if not navegar_a_seccion_canales(driver):
+        if not sesion.ir_a_canales():
             print("No se pudo acceder a la sección de canales.")
             return False
 
-        if not abrir_canal_especifico(driver, CANAL_ORIGEN):
-            print(f"No se pudo abrir el canal de origen: {CANAL_ORIGEN}")
-            return False
-
-        mensajes_extraidos = extraer_mensajes_visibles(driver)
-        if not mensajes_extraidos:
+        hashes_leidos = set()
+        canales_leidos = 0
+        trabajos_llm = []
+
+        # Cada canal se envía al LLM en un hilo aparte en cuanto se lee, de
+        # modo que Gemini procesa un canal mientras Selenium abre el siguiente.
+        # Si falla un canal posterior, lo ya extraído se guarda igualmente en
+        # el finally para no pagar de nuevo esas llamadas en la siguiente pasada.
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as ejecutor_llm:
+                for canal in CANALES_ORIGEN:
+                    if not sesion.abrir_canal(canal):
+                        print(f"No se pudo abrir el canal de origen: {canal}")
+                        continue
+
+                    mensajes_extraidos = sesion.extraer_visibles()
+                    if not mensajes_extraidos:
+                        print(f"No se encontraron mensajes para procesar en el canal: {canal}")
+                        continue
+                    canales_leidos += 1
+
+                    # Los mensajes ya guardados se descartan con una sola consulta,
+                    # para no llamar al LLM con mensajes ya procesados.
+                    extraidos = dict(filtrar_mensajes_nuevos(mensajes_extraidos, hashes_leidos))
+                    hashes_existentes = obtener_hashes_existentes(extraidos)
+                    registrar_mensajes_vistos(extraidos[hash_mensaje] for hash_mensaje in hashes_existentes)
+                    pendientes = [(hash_mensaje, mensaje) for hash_mensaje, mensaje in extraidos.items()
+                                  if hash_mensaje not in hashes_existentes]
+                    if DEBUG:
+                        print(f"{len(hashes_existentes)} mensajes ya procesados anteriormente. Saltando...")
+
+                    if pendientes:
+                        print(f"Procesando {len(pendientes)} mensajes nuevos del canal {canal}...")
+                        futuro = ejecutor_llm.submit(
+                            extraer_campos_con_llm_batch, [mensaje for _, mensaje in pendientes]
+                        )
+                        trabajos_llm.append((canal, pendientes, futuro))
+        finally:
+            # El executor ya ha esperado a los futuros al salir del with.
+            mensajes_nuevos = guardar_resultados_llm(trabajos_llm)
+
+        if not canales_leidos:
             print("No se encontraron mensajes para procesar.")
             return False
 
-        mensajes_nuevos = 0
-        for mensaje in mensajes_extraidos:
-            try:
-                hash_mensaje = generar_hash_mensaje(mensaje)
-                if mensaje_ya_existe(hash_mensaje):
-                    if DEBUG:
-                        print("Mensaje ya procesado anteriormente. Saltando...")
-                    continue
-
-                print("Procesando mensaje nuevo...")
-                campos_extraidos = extraer_campos_con_llm(mensaje)
-                insertar_mensaje_bd(mensaje, CANAL_ORIGEN, campos_extraidos)
-                mensajes_nuevos += 1
-
-            except Exception as e:
-                print(f"Error procesando mensaje: {e}")
-                continue
-
         print(f"Scraping completado: {mensajes_nuevos} mensajes nuevos procesados.")
         return True
 
     except Exception as e:
         print(f"Error durante el proceso de scraping: {e}")
+        sesion.reiniciar()
         return False
 
-    finally:
-        driver.quit()
-        print("Navegador cerrado.")
-
 
-def enviar_mensajes_individuales():
+def enviar_mensajes_individuales(sesion=None):
     """
-    Envía individualmente cada mensaje almacenado del día al canal destino.
+    Envía individualmente cada mensaje del día que aún no se haya enviado al canal destino.
     Usa Selenium para abrir el navegador, acceder al canal y enviar cada mensaje.
+    Los mensajes enviados se marcan en la base de datos para que las siguientes
+    ejecuciones del día no los repitan.
+    
+    Args:
+        sesion (SesionWhatsApp, optional): Sesión a reutilizar. Por defecto
+            se usa la sesión compartida.
     
     Returns:
         bool: True si los mensajes se enviaron correctamente, False en caso contrario.
     """
     print("===== INICIANDO ENVÍO DE MENSAJES INDIVIDUALES =====")
-    mensajes = obtener_mensajes_del_dia()
+    crear_tabla_mensajes()
+    mensajes = obtener_mensajes_pendientes_envio()
 
     if not mensajes:
         print("No hay mensajes nuevos para enviar.")
         return False
 
-    driver = inicializar_navegador()
-    
+    ids_enviados = []
+    sesion = sesion or SesionWhatsApp()
     try:
-        abrir_whatsapp_web(driver)
+        if not sesion.ir_a_canales():
+            print("No se pudo acceder a la sección de canales.")
+            return False
 
-        if not abrir_canal_especifico(driver, CANAL_DESTINO):
+        if not sesion.abrir_canal(CANAL_DESTINO):
             print(f"No se pudo abrir el canal destino: {CANAL_DESTINO}")
             return False
 
         print(f"Enviando {len(mensajes)} mensajes individualmente...")
         for mensaje_bd in mensajes:
-            texto_original = mensaje_bd[2]
-
-            if escribir_mensaje_en_chat(driver, texto_original):
+            texto_original = mensaje_bd["texto"]
+
+            resultado = sesion.enviar_mensaje(texto_original)
+            # Los envíos sin confirmar también se marcan: lo más probable es que
+            # el mensaje sí saliera, y reintentarlo lo publicaría dos veces en
+            # el canal. Solo los envíos fallidos quedan pendientes.
+            if resultado == ENVIO_CONFIRMADO:
+                ids_enviados.append(mensaje_bd["id"])
                 if DEBUG:
                     print("Mensaje enviado correctamente.")
-                time.sleep(3)
+            elif resultado == ENVIO_SIN_CONFIRMAR:
+                ids_enviados.append(mensaje_bd["id"])
+                print(f"Advertencia: el mensaje {mensaje_bd['id']} se marca como enviado sin confirmación de WhatsApp.")
             else:
                 print("Error al enviar un mensaje.")
 
-        print("Todos los mensajes individuales fueron enviados.")
+        print(f"Mensajes individuales enviados: {len(ids_enviados)} de {len(mensajes)}.")
         return True
 
     except Exception as e:
         print(f"Error durante el envío de mensajes: {e}")
+        sesion.reiniciar()
         return False
 
     finally:
-        driver.quit()
+        marcar_mensajes_enviados(ids_enviados)
+
+
+PATRON_FUERA_BMP = re.compile(r'[^\u0000-\uFFFF]')
 
 
 def limpiar_texto_unicode(texto):
@@ -733,14 +1994,94 @@ def limpiar_texto_unicode(texto):
     Returns:
         str: Texto filtrado sin caracteres problemáticos.
     """
-    return ''.join(c for c in texto if ord(c) <= 0xFFFF)
+    return PATRON_FUERA_BMP.sub('', texto)
+
+
+PLANTILLA_CABECERA_RESUMEN = (
+    "**RESUMEN DE OPORTUNIDADES DEL DÍA**\n"
+    "Fecha: {fecha}\n"
+    "Oportunidades encontradas: {total}\n\n"
+)
+
+PLANTILLA_OPORTUNIDAD = (
+    "OPORTUNIDAD {numero}\n"
+    "- País: {pais}\n"
+    "- Ciudad: {ciudad}\n"
+    "- Fecha de inicio: {fecha_inicio}\n"
+    "- Fecha de fin: {fecha_fin}\n"
+    "- Fecha límite de inscripción: {fecha_limite}\n"
+    "- Temática: {tematica}\n"
+    "{opcionales}"
+    + "-" * 30 + "\n\n"
+)
+
+# Campos que solo se incluyen en el resumen cuando tienen valor.
+CAMPOS_OPCIONALES_RESUMEN = (
+    ("infopack", "Información adicional"),
+    ("formulario", "Formulario"),
+    ("contacto", "Contacto"),
+)
+
+PIE_RESUMEN = "Mensaje generado automáticamente por WhatsApp LLM Bot."
+
+
+def formatear_oportunidad(numero, mensaje_bd):
+    """
+    Da formato a una oportunidad del resumen diario a partir de su fila en la base de datos.
+    
+    Args:
+        numero (int): Posición de la oportunidad en el resumen.
+        mensaje_bd (sqlite3.Row): Fila del mensaje.
+    
+    Returns:
+        str: Bloque de texto de la oportunidad.
+    """
+    opcionales = "".join(
+        f"- {etiqueta}: {mensaje_bd[campo]}\n"
+        for campo, etiqueta in CAMPOS_OPCIONALES_RESUMEN
+        if mensaje_bd[campo]
+    )
+    return PLANTILLA_OPORTUNIDAD.format(
+        numero=numero,
+        pais=mensaje_bd["pais"] or "País no especificado",
+        ciudad=mensaje_bd["ciudad"] or "Ciudad no especificada",
+        fecha_inicio=mensaje_bd["fecha_inicio"] or "Fecha de inicio no especificada",
+        fecha_fin=mensaje_bd["fecha_fin"] or "Fecha de fin no especificada",
+        fecha_limite=mensaje_bd["fecha_limite_inscripcion"] or "Fecha límite de inscripción no especificada",
+        tematica=mensaje_bd["tematica"] or "Temática no especificada",
+        opcionales=opcionales
+    )
+
+
+def generar_texto_resumen(mensajes):
+    """
+    Construye el texto completo del resumen diario.
+    Cada oportunidad se formatea con una plantilla fija y el resultado se une
+    con un único join, sin concatenaciones sucesivas.
+    
+    Args:
+        mensajes (list of sqlite3.Row): Mensajes del día.
+    
+    Returns:
+        str: Texto del resumen.
+    """
+    cabecera = PLANTILLA_CABECERA_RESUMEN.format(
+        fecha=datetime.now().strftime('%d/%m/%Y'),
+        total=len(mensajes)
+    )
+    cuerpo = "".join(formatear_oportunidad(i, mensaje_bd) for i, mensaje_bd in enumerate(mensajes, 1))
+    return cabecera + cuerpo + PIE_RESUMEN
 
 
-def generar_y_enviar_resumen_diario():
+def generar_y_enviar_resumen_diario(sesion=None):
     """
     Genera un resumen estructurado con todos los mensajes del día
     y lo envía como un único mensaje al canal destino.
     
+    Args:
+        sesion (SesionWhatsApp, optional): Sesión a reutilizar. Por defecto
+            se usa la sesión compartida.
+    
     Returns:
         bool: True si el resumen se envió correctamente, False en caso contrario.
     """
@@ -751,73 +2092,39 @@ def generar_y_enviar_resumen_diario():
         print("No hay mensajes disponibles para el resumen.")
         return False
 
-    resumen = "**RESUMEN DE OPORTUNIDADES DEL DÍA**\n"
-    resumen += f"Fecha: {datetime.now().strftime('%d/%m/%Y')}\n"
-    resumen += f"Oportunidades encontradas: {len(mensajes)}\n\n"
-
-    for i, mensaje_bd in enumerate(mensajes, 1):
-        resumen += f"OPORTUNIDAD {i}\n"
-
-        pais = mensaje_bd[3] or "País no especificado"
-        ciudad = mensaje_bd[4] or "Ciudad no especificada"
-        fecha_inicio = mensaje_bd[5] or "Fecha de inicio no especificada"
-        fecha_fin = mensaje_bd[6] or "Fecha de fin no especificada"
-        fecha_limite = mensaje_bd[7] or "Fecha límite de inscripción no especificada"
-        tematica = mensaje_bd[8] or "Temática no especificada"
-        infopack = mensaje_bd[9]
-        formulario = mensaje_bd[10]
-        contacto = mensaje_bd[11]
-
-        resumen += f"- País: {pais}\n"
-        resumen += f"- Ciudad: {ciudad}\n"
-        resumen += f"- Fecha de inicio: {fecha_inicio}\n"
-        resumen += f"- Fecha de fin: {fecha_fin}\n"
-        resumen += f"- Fecha límite de inscripción: {fecha_limite}\n"
-        resumen += f"- Temática: {tematica}\n"
-
-        if infopack:
-            resumen += f"- Información adicional: {infopack}\n"
-        if formulario:
-            resumen += f"- Formulario: {formulario}\n"
-        if contacto:
-            resumen += f"- Contacto: {contacto}\n"
-
-        resumen += "-" * 30 + "\n\n"
-
-    resumen += "Mensaje generado automáticamente por WhatsApp LLM Bot."
+    resumen = generar_texto_resumen(mensajes)
 
     if DEBUG:
         print("Resumen generado:")
         print(resumen if len(resumen) < 500 else resumen[:500] + "...")
 
-    driver = inicializar_navegador()
-
+    sesion = sesion or SesionWhatsApp()
     try:
-        abrir_whatsapp_web(driver)
-
-        if not navegar_a_seccion_canales(driver):
+        if not sesion.ir_a_canales():
             print("No se pudo acceder a la sección de canales.")
             return False
 
-        if not abrir_canal_especifico(driver, CANAL_DESTINO):
+        if not sesion.abrir_canal(CANAL_DESTINO):
             print(f"No se pudo abrir el canal destino: {CANAL_DESTINO}")
             return False
 
         resumen_limpio = limpiar_texto_unicode(resumen)
-        if escribir_mensaje_en_chat(driver, resumen_limpio):
+        resultado = sesion.enviar_mensaje(resumen_limpio)
+        if resultado == ENVIO_CONFIRMADO:
             print("Resumen diario enviado correctamente.")
             return True
+        elif resultado == ENVIO_SIN_CONFIRMAR:
+            print("El resumen se envió, pero WhatsApp no confirmó la entrega.")
+            return False
         else:
             print("Error al enviar el resumen.")
             return False
 
     except Exception as e:
         print(f"Error durante el envío del resumen: {e}")
+        sesion.reiniciar()
         return False
 
-    finally:
-        driver.quit()
-
 
 def mostrar_estadisticas_mensajes():
     """
@@ -831,9 +2138,9 @@ def mostrar_estadisticas_mensajes():
     if mensajes_hoy:
         print("\nListado de mensajes:")
         for i, mensaje in enumerate(mensajes_hoy, 1):
-            fecha = mensaje[1]
-            texto_corto = mensaje[2][:80] + "..." if len(mensaje[2]) > 80 else mensaje[2]
-            lugar = mensaje[3] or "Sin lugar"
+            fecha = mensaje["fecha"]
+            texto_corto = mensaje["texto"][:80] + "..." if len(mensaje["texto"]) > 80 else mensaje["texto"]
+            lugar = mensaje["pais"] or "Sin lugar"
             print(f"{i}. [{fecha}] {lugar}")
             print(f"   {texto_corto}")
             print()
@@ -842,22 +2149,43 @@ def mostrar_estadisticas_mensajes():
 # SISTEMA DE PROGRAMACIÓN AUTOMÁTICA
 # ============================================================================
 
-def configurar_horarios_automaticos():
+def crear_trigger_diario(horario):
+    """
+    Convierte un horario en formato HH:MM en un disparador diario de APScheduler.
+    
+    Args:
+        horario (str): Hora del día en formato HH:MM.
+    
+    Returns:
+        CronTrigger: Disparador que se activa cada día a esa hora.
+    """
+    hora, minuto = horario.strip().split(":")
+    return CronTrigger(hour=int(hora), minute=int(minuto))
+
+
+def configurar_horarios_automaticos(scheduler, sesion):
     """
     Configura los horarios programados para todas las tareas del bot.
-    Usa la biblioteca 'schedule' para definir las ejecuciones diarias.
+    Registra en APScheduler un disparador diario por cada horario definido.
+    
+    Args:
+        scheduler (BlockingScheduler): Planificador en el que se registran las tareas.
+        sesion (SesionWhatsApp): Sesión de WhatsApp Web que comparten todas las tareas.
     """
     print("Configurando horarios automáticos...")
 
     for horario in HORARIOS_SCRAPING:
-        schedule.every().day.at(horario).do(ejecutar_scraping_completo)
+        scheduler.add_job(ejecutar_scraping_completo, crear_trigger_diario(horario),
+                          args=[sesion], name="Scraping")
         print(f"Scraping programado a las {horario}")
 
     for horario in HORARIOS_ENVIO:
-        schedule.every().day.at(horario).do(enviar_mensajes_individuales)
+        scheduler.add_job(enviar_mensajes_individuales, crear_trigger_diario(horario),
+                          args=[sesion], name="Envío")
         print(f"Envío programado a las {horario}")
 
-    schedule.every().day.at(HORARIO_RESUMEN).do(generar_y_enviar_resumen_diario)
+    scheduler.add_job(generar_y_enviar_resumen_diario, crear_trigger_diario(HORARIO_RESUMEN),
+                      args=[sesion], name="Resumen")
     print(f"Resumen diario programado a las {HORARIO_RESUMEN}")
 
     print("Horarios configurados correctamente.")
@@ -866,33 +2194,43 @@ def configurar_horarios_automaticos():
 def ejecutar_bucle_automatico():
     """
     Ejecuta el sistema en modo automático continuo.
-    Monitorea y ejecuta las tareas programadas en los horarios definidos.
-    Muestra mensajes de estado en consola cada cierto tiempo.
+    El planificador duerme hasta la siguiente tarea programada en lugar de
+    comprobar los horarios cada pocos segundos. Tras cada tarea muestra en
+    consola cuándo será la siguiente ejecución.
     """
     print("===== INICIANDO MODO AUTOMÁTICO =====")
     print("El bot ejecutará las siguientes tareas automáticamente:")
     print(f"  - Scraping: {', '.join(HORARIOS_SCRAPING)}")
     print(f"  - Envío: {', '.join(HORARIOS_ENVIO)}")
     print(f"  - Resumen: {HORARIO_RESUMEN}")
+    print(f"Modelo LLM: {GEMINI_MODEL_NAME} ({GEMINI_MAX_CONCURRENCIA} peticiones simultáneas, "
+          f"{GEMINI_LIMITE_RPM}/min, {LOTE_MENSAJES_LLM} mensajes por petición)")
     print("\nPara detener el bot, presione Ctrl+C.")
     print("-" * 50)
 
-    configurar_horarios_automaticos()
+    # Un único hilo de ejecución: todas las tareas comparten el navegador y
+    # no deben solaparse. Si una tarea se retrasa, las ejecuciones
+    # acumuladas se agrupan en una sola.
+    scheduler = BlockingScheduler(
+        executors={"default": ThreadPoolExecutor(1)},
+        job_defaults={"coalesce": True, "max_instances": 1, "misfire_grace_time": 3600}
+    )
+    sesion = SesionWhatsApp()
+    configurar_horarios_automaticos(scheduler, sesion)
 
-    try:
-        while True:
-            schedule.run_pending()
-            time.sleep(30)
+    def informar_estado(evento):
+        trabajo = scheduler.get_job(evento.job_id)
+        if trabajo and trabajo.next_run_time:
+            print(f"Bot activo - próxima ejecución de {trabajo.name}: "
+                  f"{trabajo.next_run_time.strftime('%d/%m/%Y %H:%M')}")
 
-            if hasattr(ejecutar_bucle_automatico, 'contador'):
-                ejecutar_bucle_automatico.contador += 1
-            else:
-                ejecutar_bucle_automatico.contador = 1
+    scheduler.add_listener(informar_estado, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
 
-            if ejecutar_bucle_automatico.contador % 10 == 0:
-                print(f"Bot activo - {datetime.now().strftime('%H:%M:%S')}")
+    try:
+        with sesion:
+            scheduler.start()
 
-    except KeyboardInterrupt:
+    except (KeyboardInterrupt, SystemExit):
         print("\nEjecución interrumpida por el usuario. Bot detenido.")
 
 # ============================================================================
@@ -903,7 +2241,7 @@ def mostrar_ayuda():
     """
     Muestra la ayuda completa del sistema
     """
-    print("""
+    print(f"""
 WhatsApp LLM Bot - Sistema de Agregación Inteligente
 ════════════════════════════════════════════════════════
 
@@ -939,7 +2277,8 @@ COMANDOS DISPONIBLES:
 CONFIGURACIÓN ACTUAL:
    📥 Canal origen: {CANAL_ORIGEN}
    📤 Canal destino: {CANAL_DESTINO}  
-   🤖 Modelo LLM: {LLAMA_MODEL}
+   🤖 Modelo LLM: {GEMINI_MODEL_NAME}
+   ⚡ Peticiones LLM: {GEMINI_MAX_CONCURRENCIA} simultáneas, {GEMINI_LIMITE_RPM}/min, {LOTE_MENSAJES_LLM} mensajes por petición
    📊 Base de datos: {RUTA_DB}
 
 EJEMPLOS DE USO:
@@ -951,7 +2290,7 @@ EJEMPLOS DE USO:
 
 REQUISITOS:
    - Chrome/Chromium instalado
-   - Ollama ejecutándose con modelo {LLAMA_MODEL}
+   - GEMINI_API_KEY configurada con acceso al modelo {GEMINI_MODEL_NAME}
    - WhatsApp Web configurado y logueado
    - Acceso a los canales configurados
 """)
@@ -1066,6 +2405,28 @@ def main():
 # FUNCIONES DE UTILIDAD Y DEBUGGING
 # ============================================================================
 
+DEPENDENCIAS_REQUERIDAS = (
+    ("selenium", "Selenium"),
+    ("requests", "Requests"),
+    ("apscheduler", "APScheduler"),
+)
+
+
+@lru_cache(maxsize=None)
+def modulo_disponible(nombre_modulo):
+    """
+    Indica si un módulo puede importarse, sin llegar a importarlo.
+    El resultado se memoriza para no repetir la búsqueda en el sistema de archivos.
+    
+    Args:
+        nombre_modulo (str): Nombre del módulo.
+    
+    Returns:
+        bool: True si el módulo está instalado.
+    """
+    return importlib.util.find_spec(nombre_modulo) is not None
+
+
 def verificar_dependencias():
     """
     Verifica que todas las dependencias estén instaladas y configuradas
@@ -1073,32 +2434,11 @@ def verificar_dependencias():
     print("Verificando dependencias del sistema...")
     
     # Verificar importaciones
-    try:
-        import selenium
-        print("Selenium instalado")
-    except ImportError:
-        print("Selenium no instalado: pip install selenium")
-        return False
-    
-    try:
-        import requests
-        print("Requests instalado")
-    except ImportError:
-        print("Requests no instalado: pip install requests")
-        return False
-    
-    try:
-        import schedule
-        print("Schedule instalado")
-    except ImportError:
-        print("Schedule no instalado: pip install schedule")
-        return False
-    
-    # Verificar directorio de datos
-    import os
-    if not os.path.exists(os.path.dirname(RUTA_DB)):
-        print(f"Creando directorio de datos: {os.path.dirname(RUTA_DB)}")
-        os.makedirs(os.path.dirname(RUTA_DB), exist_ok=True)
+    for nombre_modulo, nombre_visible in DEPENDENCIAS_REQUERIDAS:
+        if not modulo_disponible(nombre_modulo):
+            print(f"{nombre_visible} no instalado: pip install {nombre_modulo}")
+            return False
+        print(f"{nombre_visible} instalado")
     
     print("Todas las dependencias verificadas")
     return True
@@ -1111,12 +2451,12 @@ def limpiar_base_datos():
     respuesta = input("¿Estás seguro de que quieres limpiar la base de datos? (sí/no): ")
     
     if respuesta.lower() in ['sí', 'si', 'yes', 'y']:
-        conn = conectar_bd()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM mensajes")
-        cursor.execute("DELETE FROM sqlite_sequence WHERE name='mensajes'")
-        conn.commit()
-        conn.close()
+        conn = obtener_conexion_bd()
+        with _LOCK_ESCRITURA_BD:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM mensajes")
+            cursor.execute("DELETE FROM sqlite_sequence WHERE name='mensajes'")
+            conn.commit()
         print("Base de datos limpiada")
     else:
         print("Operación cancelada")
@@ -1146,8 +2486,3 @@ if __name__ == "__main__":
             import traceback
             traceback.print_exc()
         exit(1)
-
-LICENCIA:
-Este código es de uso educativo y personal.
-Respeta los términos de servicio de WhatsApp.
-"""